@@ -1,21 +1,37 @@
 import json
-import uuid
+import click
 from pathlib import Path
 from services.quiz import get_result, get_result_rank_in_quiz
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory, abort
+from flask import Flask, render_template, request, redirect, url_for, flash, session, abort, jsonify
+from flask import Response, stream_with_context
 from dotenv import load_dotenv
 
 from config import Config
-from services.db import init_db, close_db, get_db
+from services.db import close_db, get_db, get_pool_stats
+from services.migrations import check_schema, migrate, migration_status
+from services.response_cache import cached_page
+from services.uploads import allowed_image, save_upload, dedupe_uploads, sweep_uploads
+from services.images import schedule_variants, pending_variant_sources
+from services.assets import init_assets, compress_assets
+from services.metrics import init_metrics, metrics_response, untracked_queries
+from services.query_debug import init_query_debug, query_budget
+from services.response_cache import response_cache_stats
+from services.attempts import start_attempt, finish_attempt
+from services.result_queue import enqueue_result, flush as flush_results, get_pending_result, init_result_queue, queue_stats
 from services.auth import hash_password, verify_password, login_required, admin_required
+from services.auth import needs_rehash, rehash_password
 from services.quiz import (
-    search_quizzes, get_quiz, get_quiz_questions_with_options,
-    grade_quiz, save_result, get_leaderboard, create_quiz
+    search_quizzes, get_quiz,
+    grade_quiz, save_result, get_leaderboard, create_quiz, get_quiz_content, get_quiz_version, ResultRow
 )
-from services.quiz import admin_list_quizzes, delete_quiz
+from services.quiz import admin_list_quizzes, delete_quiz, list_quizzes
+from services.quiz import rebuild_leaderboard, check_leaderboard
+from services.quiz import answer_key_cache_stats, quiz_content_cache_stats, result_group_commit_stats
+from services.quiz_io import QuizImportError, import_quizzes, iter_csv, iter_json_array, iter_ndjson
+from services.quiz_io import export_ndjson
+from services.quiz import get_quiz_leaderboard, get_quiz_leaderboard_around, get_user_best_result_id
 load_dotenv()
 from services.quiz import admin_get_quiz, admin_update_quiz
-import os
 from flask import request, flash, redirect, url_for, render_template
 
 
@@ -24,21 +40,38 @@ def create_app():
     app.config.from_object(Config)
 
     Path(app.config["UPLOAD_FOLDER"]).mkdir(parents=True, exist_ok=True)
+    init_assets(app)
+    init_metrics(app)
+    init_query_debug(app)
+    init_result_queue(app)
 
     @app.before_request
-    def _ensure_schema():
-        # Инициализация схемы один раз при первом запросе
-        if not app.config.get("_SCHEMA_READY"):
-            init_db()
+    def _check_schema():
+        # Один запрос версии схемы на процесс; DDL выполняет только `flask db-upgrade`
+        if app.config["SCHEMA_CHECK"] and not app.config.get("_SCHEMA_READY"):
+            with untracked_queries():  # не в счёт бюджета маршрута, который попался первым
+                check_schema()
             app.config["_SCHEMA_READY"] = True
 
     app.teardown_appcontext(close_db)
 
-    def allowed_image(filename: str) -> bool:
-        if "." not in filename:
-            return False
-        ext = filename.rsplit(".", 1)[1].lower()
-        return ext in app.config["ALLOWED_IMAGE_EXTENSIONS"]
+    def page_size_arg(default: int) -> int:
+        """?per_page= из запроса, ограниченный MAX_PAGE_SIZE."""
+        size = request.args.get("per_page", default, type=int)
+        return max(1, min(size, app.config["MAX_PAGE_SIZE"]))
+
+    def result_stars(res) -> int:
+        ratio = (res["score"] / res["total"]) if res["total"] else 0
+        stars = 1
+        if ratio >= 0.9:
+            stars = 5
+        elif ratio >= 0.75:
+            stars = 4
+        elif ratio >= 0.5:
+            stars = 3
+        elif ratio >= 0.25:
+            stars = 2
+        return stars
 
     @app.context_processor
     def inject_user():
@@ -51,6 +84,7 @@ def create_app():
         }
 
     @app.route("/")
+    @cached_page()
     def index():
         return render_template("index.html")
 
@@ -131,6 +165,10 @@ def create_app():
                 flash("Неверная почта или пароль.")
                 return redirect(url_for("login"))
 
+            # хэш старого метода / стоимости — пересчитываем, пока пароль известен
+            if needs_rehash(pwd_hash):
+                rehash_password(user_id, password, pwd_hash)
+
             session["user_id"] = int(user_id)
             session["username"] = username
             session["role"] = role
@@ -149,12 +187,31 @@ def create_app():
     # ---------------- QUIZZES ----------------
 
     @app.route("/quizzes")
+    @cached_page("catalog")
     def quizzes():
-        q = request.args.get("q", "")
-        items = search_quizzes(q)
-        return render_template("quizzes.html", quizzes=items, q=q)
+        q = request.args.get("q", "").strip()
+        page_size = page_size_arg(app.config["SEARCH_PAGE_SIZE"])
+
+        # Каталог без запроса — курсор по (created_at, id)
+        if not q:
+            items, next_cursor = list_quizzes(request.args.get("after"), limit=page_size)
+            return render_template(
+                "quizzes.html", quizzes=items, q=q, page=1, has_next=False,
+                next_cursor=next_cursor, first_page=not request.args.get("after"),
+            )
+
+        # Поиск упорядочен по релевантности — страницы по номеру
+        page = max(1, request.args.get("page", 1, type=int))
+        # берём на одну запись больше — так узнаём, есть ли следующая страница
+        items = search_quizzes(q, limit=page_size + 1, offset=(page - 1) * page_size)
+        has_next = len(items) > page_size
+        return render_template(
+            "quizzes.html", quizzes=items[:page_size], q=q, page=page, has_next=has_next,
+            next_cursor=None, first_page=page == 1,
+        )
 
     @app.route("/quiz/<int:quiz_id>")
+    @cached_page("quiz:{quiz_id}")
     def quiz_detail(quiz_id: int):
         quiz = get_quiz(quiz_id)
         if not quiz:
@@ -163,30 +220,50 @@ def create_app():
 
     @app.route("/quiz/<int:quiz_id>/pass", methods=["GET", "POST"])
     @login_required
+    @query_budget(3)  # GET: версия + содержимое при промахе (2); POST: версия + ключ ответов при промахе + запись
     def quiz_pass(quiz_id: int):
-        quiz = get_quiz(quiz_id)
+        if request.method == "POST":
+            # ответы принимаем только по начатой попытке той же версии викторины;
+            # проверка — по кэшу ключей ответов, содержимое заново не читаем
+            version = get_quiz_version(quiz_id)
+            if version is None:
+                abort(404)
+
+            attempt = finish_attempt(quiz_id)
+            if attempt is None:
+                flash("Попытка не найдена или уже отправлена — начните заново.")
+                return redirect(url_for("quiz_pass", quiz_id=quiz_id))
+            if attempt["v"] != version:
+                flash("Викторину изменили, пока вы её проходили, — начните заново.")
+                return redirect(url_for("quiz_pass", quiz_id=quiz_id))
+
+            score, total = grade_quiz(quiz_id, dict(request.form))
+            duration_seconds = attempt["duration_seconds"]
+            points = int(score) * 100  # 100 баллов за правильный ответ
+
+            if app.config["RESULT_WRITE_BEHIND"]:
+                # в results попадёт фоновым переносом, страница пока строится из очереди
+                token = enqueue_result(ResultRow(
+                    session["user_id"], quiz_id, score, total, duration_seconds, points, token=attempt["id"]
+                ))
+                return redirect(url_for("quiz_result_pending", token=token))
+
+            result_id = save_result(
+                session["user_id"], quiz_id, score, total, duration_seconds, points, token=attempt["id"]
+            )
+            return redirect(url_for("quiz_result", result_id=result_id))
+
+        # викторина и вопросы из кэша содержимого — одна проверка версии на запрос
+        quiz = get_quiz_content(quiz_id)
         if not quiz:
             abort(404)
 
-        questions = get_quiz_questions_with_options(quiz_id)
+        questions = quiz.questions
         if not questions:
             flash("У этой викторины пока нет вопросов.")
             return redirect(url_for("quiz_detail", quiz_id=quiz_id))
 
-        if request.method == "POST":
-            answers = dict(request.form)  # {question_id: option_id}
-            score, total = grade_quiz(quiz_id, answers)
-            duration_seconds = request.form.get("duration_seconds")
-            try:
-                duration_seconds = int(duration_seconds) if duration_seconds else None
-            except:
-                duration_seconds = None
-
-            points = int(score) * 100  # 100 баллов за правильный ответ
-
-            result_id = save_result(session["user_id"], quiz_id, score, total, duration_seconds, points)
-            return redirect(url_for("quiz_result", result_id=result_id))
-
+        start_attempt(quiz_id, quiz.version)
         return render_template("quiz_pass.html", quiz=quiz, questions=questions)
 
     @app.route("/result/<int:result_id>")
@@ -197,32 +274,88 @@ def create_app():
             abort(404)
 
         rank = get_result_rank_in_quiz(result_id)
+        return render_template("result.html", res=res, rank=rank, stars=result_stars(res))
 
-        ratio = (res["score"] / res["total"]) if res["total"] else 0
-        stars = 1
-        if ratio >= 0.9:
-            stars = 5
-        elif ratio >= 0.75:
-            stars = 4
-        elif ratio >= 0.5:
-            stars = 3
-        elif ratio >= 0.25:
-            stars = 2
+    @app.route("/result/pending/<token>")
+    @login_required
+    def quiz_result_pending(token: str):
+        res = get_pending_result(token)
+        if not res or res["user_id"] != session.get("user_id"):
+            abort(404)
+        if res["id"]:
+            return redirect(url_for("quiz_result", result_id=res["id"]))
+        if res["dead"]:
+            return render_template("result.html", res=res, rank=None, stars=result_stars(res), failed=True)
 
-        return render_template("result.html", res=res, rank=rank, stars=stars)
+        # ещё в очереди: место в рейтинге неизвестно, страница обновится сама
+        return render_template("result.html", res=res, rank=None, stars=result_stars(res), pending=True)
+
+    @app.route("/metrics")
+    def metrics():
+        if not app.config["METRICS_ENABLED"]:
+            abort(404)
+        return metrics_response({
+            "db_pool": get_pool_stats(),
+            "answer_key_cache": answer_key_cache_stats(),
+            "content_cache": quiz_content_cache_stats(),
+            "response_cache": response_cache_stats(),
+            "result_group_commit": result_group_commit_stats(),
+        })
 
     @app.route("/leaderboard")
+    @cached_page("leaderboard")
     def leaderboard():
         items = get_leaderboard(50)
         return render_template("leaderboard.html", items=items)
 
+    @app.route("/quiz/<int:quiz_id>/leaderboard")
+    def quiz_leaderboard(quiz_id: int):
+        quiz = get_quiz(quiz_id)
+        if not quiz:
+            abort(404)
+
+        # "Моё окружение": по конкретной попытке (своей) или по лучшей попытке игрока
+        if request.args.get("view") == "me":
+            user_id = session.get("user_id")
+            if not user_id:
+                flash("Нужно войти в аккаунт.")
+                return redirect(url_for("login"))
+
+            result_id = request.args.get("result", type=int)
+            if result_id:
+                res = get_result(result_id)
+                if not res or res["user_id"] != user_id or res["quiz_id"] != quiz_id:
+                    abort(404)
+            else:
+                result_id = get_user_best_result_id(quiz_id, user_id)
+
+            items = get_quiz_leaderboard_around(result_id) if result_id else []
+            return render_template(
+                "quiz_leaderboard.html", quiz=quiz, items=items,
+                next_cursor=None, highlight=result_id, view="me",
+            )
+
+        after = request.args.get("after", type=int)
+        items, next_cursor = get_quiz_leaderboard(
+            quiz_id, after_result_id=after, limit=app.config["QUIZ_LEADERBOARD_PAGE_SIZE"]
+        )
+        return render_template(
+            "quiz_leaderboard.html", quiz=quiz, items=items,
+            next_cursor=next_cursor, highlight=None, view="all",
+        )
+
     # ---------------- ADMIN ----------------
 
     @app.route("/admin")
     @admin_required
     def admin_panel():
-        items = admin_list_quizzes()
-        return render_template("admin/admin_panel.html", quizzes=items)
+        items, next_cursor = admin_list_quizzes(
+            request.args.get("after"), limit=page_size_arg(app.config["ADMIN_PAGE_SIZE"])
+        )
+        return render_template(
+            "admin/admin_panel.html", quizzes=items,
+            next_cursor=next_cursor, first_page=not request.args.get("after"),
+        )
 
     @app.route("/admin/quiz/<int:quiz_id>/delete", methods=["POST"])
     @admin_required
@@ -246,14 +379,11 @@ def create_app():
             image_path = None
             file = request.files.get("image")
             if file and file.filename:
-                if not allowed_image(file.filename):
+                try:
+                    image_path = save_upload(file)
+                except ValueError:
                     flash("Неверный формат изображения (png/jpg/jpeg/webp).")
                     return redirect(url_for("admin_quiz_create"))
-                ext = file.filename.rsplit(".", 1)[1].lower()
-                new_name = f"{uuid.uuid4().hex}.{ext}"
-                save_path = Path(app.config["UPLOAD_FOLDER"]) / new_name
-                file.save(save_path)
-                image_path = f"uploads/quizzes/{new_name}"
 
             # Парсим payload
             try:
@@ -275,11 +405,7 @@ def create_app():
                     if f and f.filename:
                         if not allowed_image(f.filename):
                             raise ValueError("bad question image format")
-                        ext = f.filename.rsplit(".", 1)[1].lower()
-                        new_name = f"{uuid.uuid4().hex}.{ext}"
-                        q_save_path = Path(app.static_folder) / "uploads" / "questions" / new_name
-                        f.save(q_save_path)
-                        q["image_path"] = f"uploads/questions/{new_name}"
+                        q["image_path"] = save_upload(f)
 
             except Exception:
                 flash("Ошибка в данных вопросов. Проверь заполнение.")
@@ -292,11 +418,150 @@ def create_app():
                 image_path=image_path,
                 questions_payload=payload
             )
+            # уменьшенные копии и WebP — в фоне, страница пока покажет оригиналы
+            schedule_variants([image_path] + [q.get("image_path") for q in payload])
             flash("Викторина создана!")
             return redirect(url_for("quiz_detail", quiz_id=quiz_id))
 
         return render_template("admin/quiz_create.html")
 
+    @app.route("/admin/quizzes/import", methods=["POST"])
+    @admin_required
+    def admin_quizzes_import():
+        """
+        Массовый импорт викторин из тела запроса:
+        text/csv и application/x-ndjson читаются потоком, application/json — массив целиком.
+        """
+        mimetype = request.mimetype
+        try:
+            if mimetype == "text/csv":
+                records = iter_csv(request.stream)
+            elif mimetype in ("application/x-ndjson", "application/jsonl"):
+                records = iter_ndjson(request.stream)
+            elif mimetype == "application/json":
+                records = iter_json_array(request.get_json())
+            else:
+                return jsonify({"error": f"unsupported content type: {mimetype}"}), 415
+
+            quiz_ids = import_quizzes(
+                records, created_by=session["user_id"], batch_size=app.config["IMPORT_BATCH_SIZE"]
+            )
+        except QuizImportError as e:
+            return jsonify({"error": str(e), "line": e.line}), 400
+
+        return jsonify({"created": len(quiz_ids), "quiz_ids": quiz_ids})
+
+    @app.route("/admin/quizzes/export")
+    @admin_required
+    def admin_quizzes_export():
+        """Все викторины в NDJSON (формат импорта), потоком."""
+        return Response(
+            stream_with_context(export_ndjson(app.config["EXPORT_ITERSIZE"])),
+            mimetype="application/x-ndjson",
+            headers={"Content-Disposition": "attachment; filename=quizzes.ndjson"},
+        )
+
+    # ---------------- CLI ----------------
+
+    @app.cli.command("db-upgrade")
+    def db_upgrade_cmd():
+        """Применить недостающие миграции схемы."""
+        applied = migrate()
+        for version, name in applied:
+            click.echo(f"applied {version:04d}_{name}")
+        if not applied:
+            click.echo("schema is up to date")
+
+    @app.cli.command("db-status")
+    def db_status_cmd():
+        """Показать применённые и ожидающие миграции."""
+        for m in migration_status():
+            state = m["applied_at"].isoformat() if m["applied_at"] else "pending"
+            click.echo(f"{m['version']:04d}_{m['name']}: {state}")
+
+    @app.cli.command("quizzes-export")
+    @click.argument("output", type=click.File("w", encoding="utf-8"), default="-")
+    def quizzes_export_cmd(output):
+        """Выгрузить все викторины в NDJSON (файл или stdout)."""
+        count = 0
+        for line in export_ndjson(app.config["EXPORT_ITERSIZE"]):
+            output.write(line)
+            count += 1
+        click.echo(f"exported {count} quizzes", err=True)
+
+    @app.cli.command("quizzes-import")
+    @click.argument("source", type=click.File("rb"), default="-")
+    @click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default="ndjson")
+    @click.option("--created-by", type=int, default=None, help="id автора для созданных викторин")
+    def quizzes_import_cmd(source, fmt, created_by):
+        """Загрузить викторины из NDJSON/CSV (файл или stdin) пачками, одной транзакцией."""
+        records = iter_csv(source) if fmt == "csv" else iter_ndjson(source)
+        try:
+            quiz_ids = import_quizzes(records, created_by, batch_size=app.config["IMPORT_BATCH_SIZE"])
+        except QuizImportError as e:
+            raise click.ClickException(f"line {e.line}: {e}")
+        click.echo(f"imported {len(quiz_ids)} quizzes")
+
+    @app.cli.command("uploads-dedupe")
+    @click.option("--dry-run", is_flag=True, help="только посчитать, ничего не менять")
+    def uploads_dedupe_cmd(dry_run):
+        """Переименовать загрузки по хэшу содержимого и удалить дубликаты."""
+        stats = dedupe_uploads(dry_run=dry_run)
+        click.echo(
+            f"files: {stats['files']}, renamed: {stats['renamed']}, duplicates removed: {stats['duplicates']}, "
+            f"bytes freed: {stats['bytes_freed']}, references updated: {stats['references']}"
+            + (" (dry run)" if dry_run else "")
+        )
+
+    @app.cli.command("uploads-gc")
+    @click.option("--dry-run", is_flag=True, help="только посчитать, ничего не удалять")
+    def uploads_gc_cmd(dry_run):
+        """Удалить загрузки без ссылок старше GC_GRACE_SECONDS (включая uploads/questions)."""
+        stats = sweep_uploads(dry_run=dry_run)
+        click.echo(
+            f"files: {stats['files']}, removed: {stats['removed']}, variants removed: {stats['variants']}, "
+            f"bytes freed: {stats['bytes_freed']}" + (" (dry run)" if dry_run else "")
+        )
+
+    @app.cli.command("images-derive")
+    def images_derive_cmd():
+        """Досчитать уменьшенные копии / WebP для картинок, у которых их ещё нет."""
+        paths = pending_variant_sources()
+        failed = 0
+        for future in schedule_variants(paths):
+            if future.exception():
+                failed += 1
+        click.echo(f"images processed: {len(paths) - failed}, failed: {failed}")
+
+    @app.cli.command("assets-compress")
+    def assets_compress_cmd():
+        """Подготовить предсжатые .gz/.br копии текстовой статики."""
+        stats = compress_assets(app.static_folder)
+        click.echo(f"files: {stats['files']}, gzip written: {stats['gzip']}, brotli written: {stats['brotli']}")
+
+    @app.cli.command("results-flush")
+    def results_flush_cmd():
+        """Переносит очередь отложенной записи результатов в results."""
+        n = flush_results()
+        stats = queue_stats()
+        click.echo(f"flushed {n}, pending {stats['pending']}, dead {stats['dead']}")
+
+    @app.cli.command("leaderboard-rebuild")
+    def leaderboard_rebuild_cmd():
+        """Пересобрать user_stats (общий рейтинг) из results."""
+        count = rebuild_leaderboard()
+        click.echo(f"user_stats rebuilt: {count} players")
+
+    @app.cli.command("leaderboard-check")
+    def leaderboard_check_cmd():
+        """Сверить user_stats с results; код выхода 1 при расхождениях."""
+        diffs = check_leaderboard()
+        for d in diffs:
+            click.echo(f"user {d['user_id']}: expected {d['expected']}, actual {d['actual']}")
+        if diffs:
+            raise SystemExit(1)
+        click.echo("user_stats is consistent with results")
+
     return app
 
 
@@ -321,21 +586,18 @@ def admin_quiz_edit(quiz_id):
         # если картинку не меняем — оставляем старую
         image_path = quiz["image_path"]
 
-        # загрузка новой картинки (если у тебя уже есть save_upload — используй его)
+        # загрузка новой картинки
         file = request.files.get("image")
         if file and file.filename:
-            ext = file.filename.rsplit(".", 1)[-1].lower()
-            if ext not in {"png", "jpg", "jpeg", "webp"}:
+            try:
+                image_path = save_upload(file)  # проверяет расширение тем же allowed_image
+            except ValueError:
                 flash("Картинка должна быть png/jpg/jpeg/webp", "error")
                 return redirect(url_for("admin_quiz_edit", quiz_id=quiz_id))
 
-            os.makedirs(os.path.join(app.root_path, "static", "uploads", "quizzes"), exist_ok=True)
-            fname = f"quiz_{quiz_id}.{ext}"
-            abs_path = os.path.join(app.root_path, "static", "uploads", "quizzes", fname)
-            file.save(abs_path)
-            image_path = f"uploads/quizzes/{fname}"
-
         admin_update_quiz(quiz_id, title, subtitle, image_path)
+        if image_path != quiz["image_path"]:
+            schedule_variants([image_path])
         flash("Сохранено", "success")
         return redirect(url_for("admin_panel"))
 
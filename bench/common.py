@@ -0,0 +1,131 @@
+# bench/common.py
+"""
+Общие помощники для бенчмарков. Запускаются против локального Postgres:
+
+    DATABASE_URL=postgresql://localhost/quiz_bench python -m bench.<name>
+"""
+from __future__ import annotations
+
+import json
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from services.db import get_db
+from services.metrics import QUERY_LATENCY, InstrumentedCursor
+from services.migrations import migrate
+
+
+class CountingCursor(InstrumentedCursor):
+    """Курсор, считающий обращения к серверу (execute/executemany)."""
+
+    queries = 0
+
+    def execute(self, *args, **kwargs):
+        CountingCursor.queries += 1
+        return super().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        CountingCursor.queries += 1
+        return super().executemany(*args, **kwargs)
+
+
+@contextmanager
+def count_queries():
+    """Считает запросы, выполненные через соединение get_db() внутри блока."""
+    db = get_db()
+    prev = db.cursor_factory
+    db.cursor_factory = CountingCursor
+    CountingCursor.queries = 0
+    counter = {"queries": 0}
+    try:
+        yield counter
+    finally:
+        counter["queries"] = CountingCursor.queries
+        db.cursor_factory = prev
+
+
+def total_queries() -> int:
+    """Все SQL процесса с начала работы (по гистограмме метрик) — для подсчёта запросов маршрута."""
+    return sum(v[2] for v in QUERY_LATENCY.snapshot().values())
+
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def bench_app():
+    from app import app
+
+    return app
+
+
+def bench_user() -> int:
+    """Служебный игрок/автор для синтетических данных бенчмарков."""
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO users (email, username, password_hash)
+            VALUES ('bench@example.com', 'bench', '-')
+            ON CONFLICT (email) DO UPDATE SET email=EXCLUDED.email
+            RETURNING id
+            """
+        )
+        uid = cur.fetchone()[0]
+    db.commit()
+    return int(uid)
+
+
+def ensure_schema() -> None:
+    migrate()
+
+
+def measure(
+    fn: Callable[[], Any], repeat: int = 20, warmup: int = 2, setup: Optional[Callable[[], Any]] = None
+) -> Dict[str, float]:
+    """Время выполнения fn в миллисекундах: p50 / p95 / mean / min. setup — перед каждым вызовом, вне замера."""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "min_ms": round(samples[0], 3),
+    }
+
+
+def make_questions(n: int, prefix: str = "Вопрос") -> List[Dict[str, Any]]:
+    return [
+        {
+            "text": f"{prefix} {i}",
+            "options": [f"Вариант {i}.{k}" for k in range(1, 5)],
+            "correct": (i % 4) + 1,
+            "explanation": f"Пояснение {i}",
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def emit(name: str, rows: List[Dict[str, Any]], **meta: Any) -> None:
+    json.dump({"benchmark": name, **meta, "results": rows}, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
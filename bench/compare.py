@@ -0,0 +1,54 @@
+# bench/compare.py
+"""
+Сравнение двух прогонов bench.suite (например, до и после коммита):
+изменение p50 и числа SQL по каждому замеру. Код выхода 1, если что-то
+замедлилось больше порога или стало делать больше запросов.
+
+    python -m bench.compare bench-old.json bench-new.json [--threshold 10]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+
+def _rows(path: str) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {r["name"]: r for r in data["results"]}, data.get("revision")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="допустимый рост p50, %%")
+    args = parser.parse_args()
+
+    old, old_rev = _rows(args.old)
+    new, new_rev = _rows(args.new)
+    print(f"{old_rev or args.old} -> {new_rev or args.new}")
+
+    regressions = 0
+    for name in sorted(old.keys() | new.keys()):
+        a, b = old.get(name), new.get(name)
+        if a is None or b is None:
+            print(f"  {name:48} {'only in new' if a is None else 'only in old'}")
+            continue
+        change = (b["p50_ms"] - a["p50_ms"]) / a["p50_ms"] * 100 if a["p50_ms"] else 0.0
+        flag = ""
+        if change > args.threshold or b["round_trips"] > a["round_trips"]:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(
+            f"  {name:48} p50 {a['p50_ms']:9.3f} -> {b['p50_ms']:9.3f} ms ({change:+6.1f}%)"
+            f"  sql {a['round_trips']} -> {b['round_trips']}{flag}"
+        )
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# bench/crowd.py
+"""
+Нагрузочный тест «живой викторины»: толпа игроков входит, открывает страницу
+прохождения, думает и отправляет ответы почти одновременно — как при автоотправке
+по таймеру в main.js. Латентность p50/p99 и доля ошибок по этапам:
+login -> pass_page -> submit -> result.
+
+Приложение запускается отдельно, под gunicorn и с той же базой:
+
+    DATABASE_URL=postgresql://localhost/quiz_bench flask db-upgrade
+    DATABASE_URL=... gunicorn -w 4 --threads 8 -b 127.0.0.1:8000 app:app
+    DATABASE_URL=... python -m bench.crowd --users 500 --ramp 10 --think 20 [--jitter 0.5]
+
+Игроки и викторина создаются напрямую в базе (bench.datagen, с пометкой) и
+удаляются флагом --cleanup. Зависимостей сверх стандартной библиотеки нет.
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.cookies import SimpleCookie
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from bench import datagen
+from bench.common import bench_app, emit, ensure_schema, make_questions
+from services.auth import hash_password
+from services.db import get_db
+from services.quiz import create_quiz
+
+PASSWORD = "crowd-password"
+STAGES = ("login", "pass_page", "submit", "result")
+
+_ANSWER_RE = re.compile(r'name="(\d+)" value="(\d+)"')
+
+
+class Client:
+    """Минимальный HTTP-клиент игрока: свои cookie, без автоматических редиректов."""
+
+    def __init__(self, base_url: str, timeout: float):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.cookies: Dict[str, str] = {}
+
+    def request(self, method: str, path: str, form: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], str]:
+        headers = {"Cookie": "; ".join(f"{k}={v}" for k, v in self.cookies.items())}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            text = resp.read().decode("utf-8", "replace")
+            for raw in resp.msg.get_all("Set-Cookie") or []:
+                for name, morsel in SimpleCookie(raw).items():
+                    self.cookies[name] = morsel.value
+            return resp.status, {k.lower(): v for k, v in resp.getheaders()}, text
+        finally:
+            conn.close()
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {s: [] for s in STAGES}
+        self.errors: Dict[str, Counter] = {s: Counter() for s in STAGES}
+        self.submit_done: List[float] = []
+
+    def timed(self, stage: str, fn, check) -> Any:
+        t0 = time.perf_counter()
+        try:
+            out = fn()
+            error = check(out)
+        except Exception as e:
+            out, error = None, type(e).__name__
+        elapsed = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self.samples[stage].append(elapsed)
+            if error:
+                self.errors[stage][error] += 1
+            elif stage == "submit":
+                self.submit_done.append(time.time())
+        return None if error else out
+
+
+def _expect_redirect(prefix: str, exact: bool = False):
+    def check(out) -> Optional[str]:
+        status, headers, _ = out
+        if status != 302:
+            return f"status_{status}"
+        path = urlsplit(headers.get("location", "")).path
+        if (path != prefix) if exact else not path.startswith(prefix):
+            # например, /login — неверный пароль, /quiz/<id>/pass — попытка не найдена
+            return "redirect_" + (path or "none")
+        return None
+    return check
+
+
+def _expect_ok(out) -> Optional[str]:
+    return None if out[0] == 200 else f"status_{out[0]}"
+
+
+def _player(i: int, args, quiz_id: int, start: float, deadline: float, rec: Recorder) -> None:
+    rnd = random.Random(i)
+    client = Client(args.base_url, args.timeout)
+
+    # вход игроков растянут на ramp секунд
+    time.sleep(max(0.0, start + rnd.uniform(0, args.ramp) - time.time()))
+    form = {"email": f"crowd{i}@{datagen.USER_EMAIL_DOMAIN}", "password": PASSWORD}
+    if rec.timed("login", lambda: client.request("POST", "/login", form), _expect_redirect("/", exact=True)) is None:
+        return
+
+    page = rec.timed("pass_page", lambda: client.request("GET", f"/quiz/{quiz_id}/pass"), _expect_ok)
+    if page is None:
+        return
+    choices: Dict[str, List[str]] = {}
+    for qid, oid in _ANSWER_RE.findall(page[2]):
+        choices.setdefault(qid, []).append(oid)
+    answers = {qid: rnd.choice(opts) for qid, opts in choices.items()}
+
+    # «думает», пока не истечёт общий таймер; автоотправка — с небольшим разбросом
+    time.sleep(max(0.0, deadline + rnd.uniform(0, args.jitter) - time.time()))
+    sent = rec.timed(
+        "submit",
+        lambda: client.request("POST", f"/quiz/{quiz_id}/pass", answers),
+        _expect_redirect("/result/"),
+    )
+    if sent is None:
+        return
+
+    location = urlsplit(sent[1]["location"]).path
+    rec.timed("result", lambda: client.request("GET", location), _expect_ok)
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    return round(samples[min(len(samples) - 1, int(len(samples) * q))], 3)
+
+
+def _report(rec: Recorder, deadline: float) -> List[Dict[str, Any]]:
+    rows = []
+    for stage in STAGES:
+        samples = sorted(rec.samples[stage])
+        errors = sum(rec.errors[stage].values())
+        row: Dict[str, Any] = {
+            "stage": stage,
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+            "error_kinds": dict(rec.errors[stage]),
+        }
+        if samples:
+            row.update(p50_ms=_percentile(samples, 0.5), p99_ms=_percentile(samples, 0.99),
+                       max_ms=round(samples[-1], 3))
+        if stage == "submit" and rec.submit_done:
+            window = max(rec.submit_done) - deadline
+            row["burst_seconds"] = round(window, 3)
+            row["submits_per_s"] = round(len(rec.submit_done) / window, 1) if window > 0 else None
+        rows.append(row)
+    return rows
+
+
+def prepare_users(users: int) -> None:
+    """Игроки crowd<i>@bench.local с общим паролем."""
+    password_hash = hash_password(PASSWORD)  # один хэш на всех — подготовка не упирается в CPU
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO users (email, username, password_hash)
+            SELECT 'crowd' || s || '@' || %s, 'crowd_' || s, %s
+            FROM generate_series(1, %s) AS s
+            ON CONFLICT (email) DO UPDATE SET password_hash = EXCLUDED.password_hash
+            """,
+            (datagen.USER_EMAIL_DOMAIN, password_hash, users),
+        )
+    db.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--ramp", type=float, default=10.0, help="за сколько секунд входят все игроки")
+    parser.add_argument("--think", type=float, default=20.0, help="таймер викторины после окончания входа, сек")
+    parser.add_argument("--jitter", type=float, default=0.5, help="разброс момента автоотправки, сек")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--quiz-id", type=int, help="готовая викторина вместо создаваемой")
+    parser.add_argument("--cleanup", action="store_true", help="удалить данные bench.datagen и выйти")
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        ensure_schema()
+        if args.cleanup:
+            datagen.drop()
+            return
+        prepare_users(args.users)
+        quiz_id = args.quiz_id or create_quiz(
+            None, f"{datagen.QUIZ_TITLE_PREFIX}crowd", "", None, make_questions(args.questions)
+        )
+
+    rec = Recorder()
+    start = time.time() + 1.0
+    deadline = start + args.ramp + args.think
+    threads = [
+        threading.Thread(target=_player, args=(i, args, quiz_id, start, deadline, rec), daemon=True)
+        for i in range(1, args.users + 1)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    emit(
+        "crowd", _report(rec, deadline),
+        base_url=args.base_url, users=args.users, questions=args.questions,
+        ramp=args.ramp, think=args.think, jitter=args.jitter, quiz_id=quiz_id,
+    )
+
+
+if __name__ == "__main__":
+    main()
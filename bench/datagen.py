@@ -0,0 +1,139 @@
+# bench/datagen.py
+"""
+Синтетический набор данных для бенчмарков: N игроков, M викторин по Q вопросов
+и R результатов. Данные детерминированы (одинаковые при тех же параметрах и seed),
+помечены префиксами и перед генерацией удаляются — набор можно пересоздавать.
+
+    python -m bench.datagen [--users 1000] [--quizzes 200] [--questions 20] [--results 100000]
+    python -m bench.datagen --drop
+"""
+from __future__ import annotations
+
+import argparse
+import random
+from typing import Any, Dict, List, NamedTuple
+
+from bench.common import bench_app, emit, ensure_schema
+from services.db import get_db
+from services.quiz import create_quizzes_bulk, rebuild_leaderboard
+
+USER_EMAIL_DOMAIN = "bench.local"
+QUIZ_TITLE_PREFIX = "[bench] "
+
+TOPICS = ["история", "география", "физика", "литература", "музыка", "кино", "спорт", "биология", "химия", "искусство"]
+WORDS = ["древний", "мир", "россия", "европа", "звезды", "океаны", "поэты", "композиторы", "чемпионаты", "клетки"]
+
+QUIZ_BATCH = 100
+
+
+class Dataset(NamedTuple):
+    user_ids: List[int]
+    quiz_ids: List[int]
+    questions: int
+    results: int
+
+
+def drop() -> None:
+    """Удаляет данные предыдущей генерации (результаты — каскадом) и пересобирает user_stats."""
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute("DELETE FROM quizzes WHERE title LIKE %s", (QUIZ_TITLE_PREFIX + "%",))
+        cur.execute("DELETE FROM users WHERE email LIKE %s", (f"%@{USER_EMAIL_DOMAIN}",))
+    db.commit()
+    rebuild_leaderboard()
+
+
+def _users(n: int) -> List[int]:
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO users (email, username, password_hash)
+            SELECT 'player' || s || '@' || %s, 'bench_player_' || s, '-'
+            FROM generate_series(1, %s) AS s
+            RETURNING id
+            """,
+            (USER_EMAIL_DOMAIN, n),
+        )
+        ids = sorted(r[0] for r in cur.fetchall())
+    db.commit()
+    return ids
+
+
+def _quiz_payload(rnd: random.Random, i: int, questions: int) -> Dict[str, Any]:
+    topic, word = rnd.choice(TOPICS), rnd.choice(WORDS)
+    return {
+        "title": f"{QUIZ_TITLE_PREFIX}{topic.capitalize()}: {word} #{i}",
+        "subtitle": f"Вопросы про {rnd.choice(WORDS)} и {rnd.choice(TOPICS)}",
+        "image_path": None,
+        "questions": [
+            {
+                "text": f"{topic.capitalize()}, вопрос {k}",
+                "options": [f"Вариант {k}.{o}" for o in range(1, 5)],
+                "correct": rnd.randint(1, 4),
+                "explanation": f"Пояснение {k}",
+            }
+            for k in range(1, questions + 1)
+        ],
+    }
+
+
+def _results(user_ids: List[int], quiz_ids: List[int], questions: int, n: int) -> None:
+    """Результаты — одним INSERT ... SELECT с детерминированным разбросом баллов и времени."""
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO results (user_id, quiz_id, score, total, duration_seconds, points, created_at)
+            SELECT u[1 + (s * 7919) %% cardinality(u)],
+                   q[1 + (s * 104729) %% cardinality(q)],
+                   sc, %s, 10 + (s * 31) %% 80, sc * 100,
+                   now() - make_interval(secs => s)
+            FROM generate_series(1, %s) AS s,
+                 LATERAL (SELECT (s * 13) %% (%s + 1) AS sc) AS x,
+                 (SELECT %s::int[] AS u, %s::int[] AS q) AS ids
+            """,
+            (questions, n, questions, user_ids, quiz_ids),
+        )
+    db.commit()
+
+
+def generate(users: int, quizzes: int, questions: int, results: int, seed: int = 42) -> Dataset:
+    drop()
+    user_ids = _users(users)
+
+    rnd = random.Random(seed)
+    quiz_ids: List[int] = []
+    for start in range(0, quizzes, QUIZ_BATCH):
+        batch = [_quiz_payload(rnd, i, questions) for i in range(start + 1, min(quizzes, start + QUIZ_BATCH) + 1)]
+        quiz_ids.extend(create_quizzes_bulk(user_ids[0] if user_ids else None, batch))
+
+    if results and user_ids and quiz_ids:
+        _results(user_ids, quiz_ids, questions, results)
+        rebuild_leaderboard()
+    return Dataset(user_ids, quiz_ids, questions, results if user_ids and quiz_ids else 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--quizzes", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--results", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="только удалить сгенерированные данные")
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        ensure_schema()
+        if args.drop:
+            drop()
+            return
+        ds = generate(args.users, args.quizzes, args.questions, args.results, args.seed)
+
+    emit("datagen", [], users=len(ds.user_ids), quizzes=len(ds.quiz_ids), questions=ds.questions, results=ds.results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# bench/grading.py
+"""
+grade_quiz: число запросов и латентность для викторин на 10/50/200 вопросов —
+с холодным (после инвалидации) и тёплым кэшем ключей ответов.
+
+    python -m bench.grading [--sizes 10,50,200] [--repeat 50]
+"""
+from __future__ import annotations
+
+import argparse
+
+from bench.common import bench_app, count_queries, emit, ensure_schema, make_questions, measure
+from services.quiz import (
+    answer_key_cache_stats, create_quiz, delete_quiz, get_quiz_questions_with_options,
+    grade_quiz, invalidate_answer_key,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,50,200")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    app = bench_app()
+    rows = []
+    with app.app_context():
+        ensure_schema()
+        for n in [int(x) for x in args.sizes.split(",")]:
+            quiz_id = create_quiz(None, f"bench grading {n}", "", None, make_questions(n))
+            try:
+                # Отвечаем на все вопросы первым вариантом — как в форме: строки
+                answers = {
+                    str(q["id"]): str(q["options"][0]["id"])
+                    for q in get_quiz_questions_with_options(quiz_id)
+                }
+                answers["duration_seconds"] = "42"
+
+                def cold():
+                    invalidate_answer_key(quiz_id)
+                    return grade_quiz(quiz_id, answers)
+
+                with count_queries() as c_cold:
+                    score, total = cold()
+                with count_queries() as c_warm:
+                    grade_quiz(quiz_id, answers)
+
+                rows.append({
+                    "questions": n,
+                    "score": score,
+                    "total": total,
+                    "cold": {"round_trips": c_cold["queries"], **measure(cold, repeat=args.repeat)},
+                    "warm": {"round_trips": c_warm["queries"], **measure(lambda: grade_quiz(quiz_id, answers), repeat=args.repeat)},
+                })
+            finally:
+                delete_quiz(quiz_id)
+
+    emit("grading", rows, answer_key_cache=answer_key_cache_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# bench/group_commit.py
+"""
+Запись попыток при одновременной отправке: пропускная способность (попыток/с)
+и латентность в зависимости от числа параллельных потоков — по одной попытке
+на INSERT + COMMIT и с групповой записью (quiz.ResultGroupCommit).
+
+    python -m bench.group_commit [--concurrency 1,4,16,64] [--per-thread 50] [--window 0]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from bench.common import bench_app, bench_user, emit, ensure_schema, make_questions
+from services.quiz import ResultGroupCommit, ResultRow, create_quiz, delete_quiz, insert_results
+
+
+def _run(app, concurrency: int, per_thread: int, submit: Callable[[ResultRow], int],
+         row: ResultRow) -> Dict[str, Any]:
+    """Все потоки стартуют одновременно (как автоотправка по таймеру) и пишут per_thread попыток."""
+    barrier = threading.Barrier(concurrency + 1)
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+
+    def worker(i: int) -> None:
+        with app.app_context():
+            barrier.wait()
+            for _ in range(per_thread):
+                t0 = time.perf_counter()
+                try:
+                    submit(row)
+                except Exception:
+                    errors[i] += 1
+                latencies[i].append((time.perf_counter() - t0) * 1000)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    samples = sorted(s for lat in latencies for s in lat)
+    return {
+        "results_per_s": round(len(samples) / elapsed, 1),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+        "errors": sum(errors),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--per-thread", type=int, default=50)
+    parser.add_argument("--window", type=float, default=0.0)
+    args = parser.parse_args()
+    levels = [int(x) for x in args.concurrency.split(",")]
+
+    app = bench_app()
+    # без групповой записи каждому потоку нужно своё соединение
+    app.config["DB_POOL_MAX_SIZE"] = max(app.config["DB_POOL_MAX_SIZE"], max(levels))
+
+    rows = []
+    with app.app_context():
+        ensure_schema()
+        user_id = bench_user()
+        quiz_id = create_quiz(user_id, "bench group commit", "", None, make_questions(10))
+        row = ResultRow(user_id, quiz_id, 7, 10, 42, 700)
+        try:
+            for n in levels:
+                group = ResultGroupCommit(window=args.window)
+                rows.append({
+                    "concurrency": n,
+                    "single": _run(app, n, args.per_thread, lambda r: insert_results([r])[0], row),
+                    "group": {**_run(app, n, args.per_thread, group.submit, row), **group.stats()},
+                })
+        finally:
+            delete_quiz(quiz_id)
+
+    emit("group_commit", rows, per_thread=args.per_thread, window=args.window)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bench/password_hashing.py
+"""
+Проверка пароля при входе: время одного verify_password и входы в секунду
+на ядро для разных методов/стоимостей хэша, плюс суммарная пропускная способность
+при нескольких параллельных входах через пул services.auth. База не нужна.
+
+    python -m bench.password_hashing [--methods scrypt:32768:8:1,pbkdf2:sha256:600000]
+                                     [--concurrency 1,2,4] [--repeat 20]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.common import bench_app, emit, measure
+from services import auth
+
+DEFAULT_METHODS = "scrypt:32768:8:1,scrypt:16384:8:1,pbkdf2:sha256:600000,pbkdf2:sha256:200000"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--methods", default=DEFAULT_METHODS)
+    parser.add_argument("--concurrency", default=f"1,2,{os.cpu_count() or 1}")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--executor", default="inline", choices=["thread", "process", "inline"])
+    args = parser.parse_args()
+    levels = [int(x) for x in args.concurrency.split(",")]
+
+    app = bench_app()
+    app.config["PASSWORD_HASH_EXECUTOR"] = args.executor
+    app.config["PASSWORD_HASH_WORKERS"] = max(levels)
+
+    rows = []
+    with app.app_context():
+        for method in args.methods.split(","):
+            app.config["PASSWORD_HASH_METHOD"] = method
+            stored = auth.hash_password("correct horse battery staple")
+            single = measure(lambda: auth.verify_password("correct horse battery staple", stored), repeat=args.repeat)
+
+            scaling = []
+            for n in levels:
+                total = n * args.repeat
+
+                def login(_):
+                    with app.app_context():
+                        return auth.verify_password("correct horse battery staple", stored)
+
+                with ThreadPoolExecutor(max_workers=n) as pool:
+                    t0 = time.perf_counter()
+                    list(pool.map(login, range(total)))
+                    elapsed = time.perf_counter() - t0
+                scaling.append({"concurrency": n, "logins_per_s": round(total / elapsed, 1)})
+
+            rows.append({
+                "method": method,
+                "verify": single,
+                "logins_per_s_per_core": round(1000 / single["p50_ms"], 1) if single["p50_ms"] else None,
+                "scaling": scaling,
+            })
+
+    emit("password_hashing", rows, executor=args.executor, cpus=os.cpu_count())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# bench/questions_loader.py
+"""
+get_quiz_questions_with_options: число запросов и латентность
+в зависимости от количества вопросов в викторине — сборка из БД (cold)
+и через кэш содержимого викторины (warm).
+
+    python -m bench.questions_loader [--sizes 10,30,100] [--repeat 50]
+"""
+from __future__ import annotations
+
+import argparse
+
+from bench.common import bench_app, count_queries, emit, ensure_schema, make_questions, measure
+from services.quiz import _load_quiz_content, create_quiz, delete_quiz, get_quiz_questions_with_options
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,30,100,300")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    app = bench_app()
+    rows = []
+    with app.app_context():
+        ensure_schema()
+        for n in [int(x) for x in args.sizes.split(",")]:
+            quiz_id = create_quiz(None, f"bench loader {n}", "", None, make_questions(n))
+            try:
+                with count_queries() as c_cold:
+                    _load_quiz_content(quiz_id)
+                get_quiz_questions_with_options(quiz_id)
+                with count_queries() as c_warm:
+                    get_quiz_questions_with_options(quiz_id)
+
+                rows.append({
+                    "questions": n,
+                    "cold": {"round_trips": c_cold["queries"], **measure(lambda: _load_quiz_content(quiz_id), repeat=args.repeat)},
+                    "warm": {"round_trips": c_warm["queries"], **measure(lambda: get_quiz_questions_with_options(quiz_id), repeat=args.repeat)},
+                })
+            finally:
+                delete_quiz(quiz_id)
+
+    emit("questions_loader", rows)
+
+
+if __name__ == "__main__":
+    main()
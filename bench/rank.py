@@ -0,0 +1,82 @@
+# bench/rank.py
+"""
+Нагрузочный тест get_result_rank_in_quiz: латентность для лучшей, средней и
+худшей попытки по мере роста числа результатов одной викторины.
+
+    python -m bench.rank [--sizes 1000,10000,100000,1000000] [--repeat 30]
+"""
+from __future__ import annotations
+
+import argparse
+
+from bench.common import bench_app, bench_user, emit, ensure_schema, make_questions, measure
+from services.db import get_db
+from services.quiz import create_quiz, delete_quiz, get_result_rank_in_quiz
+
+
+def _fill_results(quiz_id: int, user_id: int, upto: int, have: int) -> None:
+    """Дозаполняет результаты викторины до upto штук (разброс баллов и времени)."""
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO results (user_id, quiz_id, score, total, duration_seconds, points, created_at)
+            SELECT %s, %s, s %% 11, 10, 10 + (s * 7919) %% 80, (s %% 11) * 100,
+                   now() - make_interval(secs => s)
+            FROM generate_series(%s::int, %s::int) AS s
+            """,
+            (user_id, quiz_id, have + 1, upto),
+        )
+    db.commit()
+    with db.cursor() as cur:
+        cur.execute("ANALYZE results")
+    db.commit()
+
+
+def _probe_ids(quiz_id: int) -> dict:
+    db = get_db()
+    with db.cursor() as cur:
+        probes = {}
+        for label, order in (("best", "DESC"), ("worst", "ASC")):
+            cur.execute(
+                f"SELECT id FROM results WHERE quiz_id=%s ORDER BY points {order}, id LIMIT 1",
+                (quiz_id,),
+            )
+            probes[label] = cur.fetchone()[0]
+        cur.execute(
+            "SELECT id FROM results WHERE quiz_id=%s AND points=500 ORDER BY id LIMIT 1",
+            (quiz_id,),
+        )
+        probes["middle"] = cur.fetchone()[0]
+    return probes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    app = bench_app()
+    rows = []
+    with app.app_context():
+        ensure_schema()
+        user_id = bench_user()
+        quiz_id = create_quiz(user_id, "bench rank", "", None, make_questions(10))
+        try:
+            have = 0
+            for n in sorted(int(x) for x in args.sizes.split(",")):
+                _fill_results(quiz_id, user_id, n, have)
+                have = n
+                for label, rid in _probe_ids(quiz_id).items():
+                    rank = get_result_rank_in_quiz(rid)
+                    timing = measure(lambda: get_result_rank_in_quiz(rid), repeat=args.repeat)
+                    rows.append({"results": n, "probe": label, "rank": rank, **timing})
+        finally:
+            delete_quiz(quiz_id)
+
+    emit("rank", rows)
+
+
+if __name__ == "__main__":
+    main()
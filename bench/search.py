@@ -0,0 +1,80 @@
+# bench/search.py
+"""
+search_quizzes на синтетическом каталоге (по умолчанию 100k викторин):
+полнотекстовый запрос, часть слова, фраза из описания, пустой запрос.
+
+    python -m bench.search [--quizzes 100000] [--repeat 30]
+"""
+from __future__ import annotations
+
+import argparse
+
+from bench.common import bench_app, bench_user, emit, ensure_schema, measure
+from services.db import get_db
+from services.quiz import search_quizzes
+
+TOPICS = ["история", "география", "физика", "литература", "музыка", "кино", "спорт", "биология", "химия", "искусство"]
+WORDS = ["древний", "мир", "россия", "европа", "звезды", "океаны", "поэты", "композиторы", "чемпионаты", "клетки"]
+
+QUERIES = {
+    "word": "истории",          # морфология: история/истории
+    "prefix": "геогр",          # часть слова — триграммы
+    "subtitle_phrase": "вопросы про океаны",
+    "rare": "композиторы европы",
+    "empty": "",
+}
+
+
+def _generate(n: int, user_id: int) -> None:
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO quizzes (title, subtitle, created_by, created_at)
+            SELECT initcap((%s::text[])[1 + s %% 10]) || ': ' || (%s::text[])[1 + (s / 10) %% 10] || ' #' || s,
+                   'Вопросы про ' || (%s::text[])[1 + (s / 100) %% 10] || ' и ' || (%s::text[])[1 + (s * 7) %% 10],
+                   %s,
+                   now() - make_interval(secs => s)
+            FROM generate_series(1, %s) AS s
+            """,
+            (TOPICS, WORDS, WORDS, TOPICS, user_id, n),
+        )
+    db.commit()
+    with db.cursor() as cur:
+        cur.execute("ANALYZE quizzes")
+    db.commit()
+
+
+def _cleanup(user_id: int) -> None:
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute("DELETE FROM quizzes WHERE created_by=%s", (user_id,))
+    db.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quizzes", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    app = bench_app()
+    rows = []
+    with app.app_context():
+        ensure_schema()
+        user_id = bench_user()
+        _generate(args.quizzes, user_id)
+        try:
+            for label, q in QUERIES.items():
+                found = len(search_quizzes(q, limit=args.limit))
+                timing = measure(lambda: search_quizzes(q, limit=args.limit), repeat=args.repeat)
+                rows.append({"query": label, "q": q, "returned": found, **timing})
+        finally:
+            _cleanup(user_id)
+
+    emit("search", rows, quizzes=args.quizzes, limit=args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# bench/suite.py
+"""
+Сводный бенчмарк горячих путей на синтетическом наборе (bench.datagen):
+сервисные функции и соответствующие маршруты через test client Flask.
+Для каждого замера — число SQL и латентность; JSON с ревизией git, чтобы
+сравнивать коммиты (bench.compare).
+
+    python -m bench.suite [--users 1000] [--quizzes 200] [--questions 20] [--results 100000]
+                          [--repeat 50] [--no-response-cache] [--keep] > bench-<rev>.json
+"""
+from __future__ import annotations
+
+import argparse
+from typing import Any, Callable, Dict, List, Optional
+
+from bench import datagen
+from bench.common import bench_app, count_queries, emit, ensure_schema, git_revision, measure, total_queries
+from services.db import get_db
+from services.quiz import (
+    _load_quiz_content, get_leaderboard, get_quiz_questions_with_options, get_result_rank_in_quiz,
+    grade_quiz, invalidate_answer_key, save_result, search_quizzes,
+)
+
+
+def _median_result(quiz_id: int) -> int:
+    """Попытка из середины рейтинга викторины — типичный случай для подсчёта места."""
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            SELECT id FROM results WHERE quiz_id = %s
+            ORDER BY points DESC, id
+            OFFSET (SELECT COUNT(*) / 2 FROM results WHERE quiz_id = %s) LIMIT 1
+            """,
+            (quiz_id, quiz_id),
+        )
+        row = cur.fetchone()
+    db.rollback()
+    return int(row[0]) if row else 0
+
+
+def _service(name: str, fn: Callable[[], Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    if setup:
+        setup()
+    with count_queries() as c:
+        fn()
+    return {"name": f"service.{name}", "round_trips": c["queries"], **measure(fn, repeat=repeat, setup=setup)}
+
+
+def _route(client, name: str, method: str, url: str, repeat: int,
+           setup: Optional[Callable[[], Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+    def call():
+        resp = client.open(url, method=method, **kwargs)
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{method} {url}: {resp.status_code}")
+        return resp
+
+    if setup:
+        setup()
+    before = total_queries()
+    status = call().status_code
+    return {
+        "name": f"route.{name}",
+        "status": status,
+        "round_trips": total_queries() - before,
+        **measure(call, repeat=repeat, setup=setup),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--quizzes", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--results", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--no-response-cache", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="не удалять набор данных после замеров")
+    args = parser.parse_args()
+
+    app = bench_app()
+    app.config["SCHEMA_CHECK"] = False
+    if args.no_response_cache:
+        app.config["RESPONSE_CACHE_ENABLED"] = False
+
+    rows: List[Dict[str, Any]] = []
+    with app.app_context():
+        ensure_schema()
+        ds = datagen.generate(args.users, args.quizzes, args.questions, args.results)
+        quiz_id = ds.quiz_ids[len(ds.quiz_ids) // 2]
+        user_id = ds.user_ids[0]
+        result_id = _median_result(quiz_id)
+
+        own_result_id = save_result(user_id, quiz_id, 10, args.questions, 42, 1000)
+
+        questions = get_quiz_questions_with_options(quiz_id)
+        answers = {str(q["id"]): str(q["options"][0]["id"]) for q in questions}
+
+        rows += [
+            _service("search_quizzes.word", lambda: search_quizzes("истории", limit=24), args.repeat),
+            _service("search_quizzes.empty", lambda: search_quizzes("", limit=24), args.repeat),
+            _service("get_quiz_questions_with_options.cold", lambda: _load_quiz_content(quiz_id), args.repeat),
+            _service("get_quiz_questions_with_options.warm", lambda: get_quiz_questions_with_options(quiz_id), args.repeat),
+            _service("grade_quiz.cold", lambda: grade_quiz(quiz_id, answers), args.repeat,
+                     setup=lambda: invalidate_answer_key(quiz_id)),
+            _service("grade_quiz.warm", lambda: grade_quiz(quiz_id, answers), args.repeat),
+            _service("save_result", lambda: save_result(user_id, quiz_id, 10, args.questions, 42, 1000), args.repeat),
+            _service("get_result_rank_in_quiz", lambda: get_result_rank_in_quiz(result_id), args.repeat),
+            _service("get_leaderboard", lambda: get_leaderboard(50), args.repeat),
+        ]
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["username"] = "bench_player_1"
+        sess["role"] = "user"
+
+    def start_attempt():
+        client.get(f"/quiz/{quiz_id}/pass")
+
+    rows += [
+        _route(client, "index", "GET", "/", args.repeat),
+        _route(client, "quizzes", "GET", "/quizzes", args.repeat),
+        _route(client, "quizzes.search", "GET", "/quizzes?q=истории", args.repeat),
+        _route(client, "quiz_detail", "GET", f"/quiz/{quiz_id}", args.repeat),
+        _route(client, "quiz_pass.get", "GET", f"/quiz/{quiz_id}/pass", args.repeat),
+        _route(client, "quiz_pass.post", "POST", f"/quiz/{quiz_id}/pass", args.repeat,
+               setup=start_attempt, data=answers),
+        _route(client, "quiz_result", "GET", f"/result/{own_result_id}", args.repeat),
+        _route(client, "leaderboard", "GET", "/leaderboard", args.repeat),
+        _route(client, "quiz_leaderboard", "GET", f"/quiz/{quiz_id}/leaderboard", args.repeat),
+    ]
+
+    if not args.keep:
+        with app.app_context():
+            datagen.drop()
+
+    emit(
+        "suite", rows,
+        revision=git_revision(),
+        dataset={"users": args.users, "quizzes": args.quizzes, "questions": args.questions, "results": args.results},
+        repeat=args.repeat,
+        response_cache=app.config["RESPONSE_CACHE_ENABLED"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -15,4 +15,93 @@ class Config:
 
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", str(BASE_DIR / "static" / "uploads" / "quizzes"))
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB
-    ALLOWED_IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
\ No newline at end of file
+    ALLOWED_IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
+
+    # Проверять версию схемы при первом запросе воркера (миграции — `flask db-upgrade`)
+    SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "1") == "1"
+
+    # Пул соединений с Postgres (на один процесс / воркер gunicorn)
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "4"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # ожидание свободного соединения, сек
+    DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+    DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+
+    # Кэш ключей ответов (question_id -> правильный option_id), число викторин
+    ANSWER_KEY_CACHE_SIZE = int(os.getenv("ANSWER_KEY_CACHE_SIZE", "1024"))
+
+    # Размер страницы рейтинга викторины (keyset-пагинация)
+    QUIZ_LEADERBOARD_PAGE_SIZE = int(os.getenv("QUIZ_LEADERBOARD_PAGE_SIZE", "20"))
+
+    # Размеры страниц каталога / поиска викторин и админки; ?per_page= не больше MAX_PAGE_SIZE
+    SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "24"))
+    ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "50"))
+    MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+    # Массовый импорт / экспорт викторин: размер пачки вставки и строк серверного курсора
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "200"))
+    EXPORT_ITERSIZE = int(os.getenv("EXPORT_ITERSIZE", "2000"))
+
+    # Кэш готовых страниц (/, /quizzes, /quiz/<id>, /leaderboard) с ETag / 304.
+    # "memory" инвалидируется только в своём воркере: в остальных страница живёт до TTL
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+
+    # Кэш содержимого викторин (вопросы/варианты) по (id, version):
+    # "memory" — в процессе, "file" — общий для воркеров каталог на диске, либо путь к классу
+    QUIZ_CONTENT_CACHE_BACKEND = os.getenv("QUIZ_CONTENT_CACHE_BACKEND", "memory")
+    QUIZ_CONTENT_CACHE_SIZE = int(os.getenv("QUIZ_CONTENT_CACHE_SIZE", "512"))
+    QUIZ_CONTENT_CACHE_DIR = os.getenv("QUIZ_CONTENT_CACHE_DIR")  # для "file" обязателен: свой каталог, 0700
+
+    # Производные картинок (services.images): ширины уменьшенных копий и число фоновых потоков
+    IMAGE_VARIANT_WIDTHS = tuple(int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(","))
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+    # Отложенная запись результатов (services.result_queue): попытка сначала в локальную
+    # очередь SQLite, в results — фоновым потоком пачками
+    RESULT_WRITE_BEHIND = os.getenv("RESULT_WRITE_BEHIND", "0") == "1"
+    RESULT_QUEUE_PATH = os.getenv("RESULT_QUEUE_PATH", str(BASE_DIR / "instance" / "result_queue.sqlite3"))
+    RESULT_QUEUE_FLUSH_INTERVAL = float(os.getenv("RESULT_QUEUE_FLUSH_INTERVAL", "0.5"))
+    RESULT_QUEUE_BATCH_SIZE = int(os.getenv("RESULT_QUEUE_BATCH_SIZE", "500"))
+    RESULT_QUEUE_RETENTION = float(os.getenv("RESULT_QUEUE_RETENTION", "3600"))  # перенесённые записи, сек
+    RESULT_QUEUE_MAX_ATTEMPTS = int(os.getenv("RESULT_QUEUE_MAX_ATTEMPTS", "5"))  # после — запись dead, не блокирует очередь
+
+    # Групповая запись попыток (quiz.ResultGroupCommit): параллельные отправки одного
+    # воркера — один INSERT и один COMMIT; окно ожидания попутчиков, сек, и размер пачки
+    RESULT_GROUP_COMMIT = os.getenv("RESULT_GROUP_COMMIT", "1") == "1"
+    RESULT_GROUP_COMMIT_WINDOW = float(os.getenv("RESULT_GROUP_COMMIT_WINDOW", "0"))
+    RESULT_GROUP_COMMIT_MAX_BATCH = int(os.getenv("RESULT_GROUP_COMMIT_MAX_BATCH", "200"))
+
+    # Попытка прохождения (services.attempts): после стольких секунд от открытия страницы
+    # ответы не принимаются — нужно начать заново
+    ATTEMPT_MAX_AGE = int(os.getenv("ATTEMPT_MAX_AGE", str(6 * 3600)))
+
+    # Метрики (services.metrics): GET /metrics в формате Prometheus, по умолчанию выключены;
+    # METRICS_TOKEN — Bearer-токен для доступа (без него /metrics отвечает только в debug),
+    # METRICS_DIR — общий каталог снимков воркеров; SLOW_QUERY_MS — порог журнала
+    # медленных SQL (0 — выключен)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    METRICS_DIR = os.getenv("METRICS_DIR")
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+    # Детектор N+1 (services.query_debug) — для разработки и тестов: повтор одного запроса
+    # не меньше N_PLUS_ONE_THRESHOLD раз за запрос пишется в лог; QUERY_BUDGET — бюджет SQL
+    # маршрута по умолчанию (0 — без бюджета), при QUERY_BUDGET_STRICT превышение — исключение
+    QUERY_DEBUG = os.getenv("QUERY_DEBUG", "0") == "1"
+    N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "3"))
+    QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "0"))
+    QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "0") == "1"
+
+    # Хэширование паролей (services.auth): метод Werkzeug со стоимостью, например
+    # "scrypt:32768:8:1" или "pbkdf2:sha256:600000"; хэши со старыми параметрами
+    # пересчитываются при входе. PASSWORD_HASH_EXECUTOR: "inline" — в потоке запроса;
+    # "thread" / "process" — пул на PASSWORD_HASH_WORKERS. Поток запроса всё равно ждёт
+    # результат, так что пул не ускоряет вход, а лишь ограничивает число одновременных
+    # хэшей на воркер (остальные входы ждут в очереди, CPU остаётся другим запросам)
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_SALT_LENGTH = int(os.getenv("PASSWORD_HASH_SALT_LENGTH", "16"))
+    PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "inline")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
@@ -0,0 +1,131 @@
+# services/assets.py
+"""
+Статика с отпечатками: asset_url() добавляет к URL хэш содержимого (?v=...),
+такие ответы (и загрузки с адресацией по содержимому) отдаются с
+Cache-Control: immutable на год. Если рядом лежит предсжатая копия
+(.br / .gz, см. `flask assets-compress`) и клиент её принимает — отдаётся она.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+from flask import Flask, current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli — необязательная зависимость, без неё только gzip
+    brotli = None
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# <sha256>.<ext> и производные <sha256>_<width>.<ext> — имя уже и есть отпечаток
+_CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}(_\d+)?\.[a-z0-9]+$")
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+
+_hashes: Dict[str, Tuple[int, int, str]] = {}
+_hashes_lock = threading.Lock()
+
+
+def is_content_addressed(filename: str) -> bool:
+    return bool(_CONTENT_ADDRESSED.match(os.path.basename(filename)))
+
+
+def _fingerprint(path: str) -> str:
+    """Короткий хэш содержимого; пересчитывается только при смене mtime/размера."""
+    st = os.stat(path)
+    with _hashes_lock:
+        cached = _hashes.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()[:12]
+    with _hashes_lock:
+        _hashes[path] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+
+def asset_url(filename: str) -> str:
+    """Замена url_for('static', filename=...) в шаблонах — с отпечатком содержимого."""
+    if is_content_addressed(filename):
+        return url_for("static", filename=filename)
+
+    path = safe_join(current_app.static_folder, filename)
+    if not path or not os.path.isfile(path):
+        return url_for("static", filename=filename)
+    return url_for("static", filename=filename, v=_fingerprint(path))
+
+
+def send_static(filename: str):
+    """Вьюха static: предсжатые копии по Accept-Encoding и immutable-кэш для отпечатков."""
+    static = current_app.static_folder
+    response = None
+
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding not in request.accept_encodings:
+            continue
+        compressed = safe_join(static, filename + suffix)
+        original = safe_join(static, filename)
+        # устаревшую сжатую копию (оригинал правили после сжатия) не отдаём
+        if (
+            compressed and original
+            and os.path.isfile(compressed) and os.path.isfile(original)
+            and os.path.getmtime(compressed) >= os.path.getmtime(original)
+        ):
+            mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            response = send_from_directory(static, filename + suffix, mimetype=mimetype)
+            response.headers["Content-Encoding"] = encoding
+            break
+
+    if response is None:
+        response = send_from_directory(static, filename)
+    if Path(filename).suffix in COMPRESSIBLE:
+        response.vary.add("Accept-Encoding")
+
+    if request.args.get("v") or is_content_addressed(filename):
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
+
+def init_assets(app: Flask) -> None:
+    app.jinja_env.globals["asset_url"] = asset_url
+    app.view_functions["static"] = send_static
+
+
+def compress_assets(static_folder: str) -> Dict[str, int]:
+    """Кладёт рядом с текстовой статикой .gz (и .br, если есть brotli), если они устарели."""
+    stats = {"files": 0, "gzip": 0, "brotli": 0}
+    for root, _dirs, files in os.walk(static_folder):
+        for name in files:
+            path = Path(root) / name
+            if path.suffix not in COMPRESSIBLE:
+                continue
+            stats["files"] += 1
+            data = path.read_bytes()
+            mtime = path.stat().st_mtime
+
+            targets = [(path.with_name(name + ".gz"), lambda d: gzip.compress(d, 9, mtime=0), "gzip")]
+            if brotli is not None:
+                targets.append((path.with_name(name + ".br"), lambda d: brotli.compress(d, quality=11), "brotli"))
+
+            for target, compress, key in targets:
+                if target.exists() and target.stat().st_mtime >= mtime:
+                    continue
+                target.write_bytes(compress(data))
+                stats[key] += 1
+    return stats
@@ -0,0 +1,56 @@
+# services/attempts.py
+"""
+Состояние попытки прохождения викторины.
+
+GET /quiz/<id>/pass начинает попытку: в подписанную сессию пишется
+{"id": uuid, "v": версия содержимого, "t": время начала}. Порядок вопросов
+задан содержимым (id, version) — хранить сам список не нужно.
+
+POST принимает ответы только при наличии попытки той же версии викторины
+(викторину правили во время прохождения — попытка начинается заново), время
+считает сервер (клиентскому duration_seconds больше не верим).
+
+Сессия хранится в cookie: finish_attempt убирает попытку из новой cookie, но
+старую клиент может прислать снова. Поэтому от повторной записи защищает не
+сессия, а id попытки — он становится results.client_token, и повторная отправка
+(в том числе со старой cookie) возвращает тот же результат, а не создаёт второй.
+"""
+from __future__ import annotations
+
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from flask import current_app, session
+
+# Сколько незавершённых попыток (разных викторин) держим в cookie
+MAX_OPEN_ATTEMPTS = 5
+
+
+def start_attempt(quiz_id: int, version: int) -> Dict[str, Any]:
+    attempts = dict(session.get("attempts") or {})
+    attempts.pop(str(quiz_id), None)
+    while len(attempts) >= MAX_OPEN_ATTEMPTS:
+        attempts.pop(min(attempts, key=lambda k: attempts[k]["t"]))
+
+    attempt = {"id": str(uuid.uuid4()), "v": version, "t": int(time.time())}
+    attempts[str(quiz_id)] = attempt
+    session["attempts"] = attempts
+    return attempt
+
+
+def finish_attempt(quiz_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Забирает попытку викторины из сессии. None — попытки нет (не открывали
+    страницу, уже отправили) или она старше ATTEMPT_MAX_AGE.
+    """
+    attempts = dict(session.get("attempts") or {})
+    attempt = attempts.pop(str(quiz_id), None)
+    session["attempts"] = attempts
+    if attempt is None:
+        return None
+
+    elapsed = int(time.time()) - attempt["t"]
+    if elapsed > current_app.config["ATTEMPT_MAX_AGE"]:
+        return None
+    return {**attempt, "duration_seconds": max(0, elapsed)}
@@ -1,12 +1,77 @@
-from functools import wraps
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, wraps
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask import session, redirect, url_for, flash
+from flask import current_app, session, redirect, url_for, flash
+
+from services.db import get_db
+
+_hash_executor: Executor | None = None
+_hash_executor_pid: int | None = None
+_hash_executor_lock = threading.Lock()
+
+def _get_hash_executor() -> Executor | None:
+    """
+    Пул для хэширования паролей (PASSWORD_HASH_EXECUTOR): ограничивает число
+    одновременных дорогих хэшей на воркер, "process" уносит их из процесса воркера.
+    Задержку входа пул не уменьшает — _run ждёт результат. "inline" — считать в
+    потоке запроса.
+    """
+    global _hash_executor, _hash_executor_pid
+    kind = current_app.config["PASSWORD_HASH_EXECUTOR"]
+    if kind == "inline":
+        return None
+
+    pid = os.getpid()
+    if _hash_executor is None or _hash_executor_pid != pid:
+        with _hash_executor_lock:
+            if _hash_executor is None or _hash_executor_pid != pid:
+                workers = current_app.config["PASSWORD_HASH_WORKERS"]
+                if kind == "process":
+                    _hash_executor = ProcessPoolExecutor(max_workers=workers)
+                else:
+                    _hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+                _hash_executor_pid = pid
+    return _hash_executor
+
+def _run(fn, *args):
+    executor = _get_hash_executor()
+    if executor is None:
+        return fn(*args)
+    return executor.submit(fn, *args).result()
+
+@lru_cache(maxsize=None)
+def _method_prefix(method: str) -> str:
+    # "scrypt" -> "scrypt:32768:8:1": так метод записан в начале сохранённого хэша
+    return generate_password_hash("", method=method, salt_length=1).split("$", 1)[0]
 
 def hash_password(password: str) -> str:
-    return generate_password_hash(password)
+    cfg = current_app.config
+    return _run(generate_password_hash, password, cfg["PASSWORD_HASH_METHOD"], cfg["PASSWORD_HASH_SALT_LENGTH"])
 
 def verify_password(password: str, password_hash: str) -> bool:
-    return check_password_hash(password_hash, password)
+    return _run(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash: str) -> bool:
+    """Хэш посчитан не текущим методом / стоимостью из Config."""
+    return password_hash.split("$", 1)[0] != _method_prefix(current_app.config["PASSWORD_HASH_METHOD"])
+
+def rehash_password(user_id: int, password: str, old_hash: str) -> bool:
+    """
+    Пересчитывает хэш с текущими параметрами после успешного входа.
+    Не перезаписывает, если пароль за это время сменили.
+    """
+    new_hash = hash_password(password)
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            "UPDATE users SET password_hash=%s WHERE id=%s AND password_hash=%s",
+            (new_hash, user_id, old_hash),
+        )
+        updated = cur.rowcount == 1
+    db.commit()
+    return updated
 
 def login_required(view):
     @wraps(view)
@@ -0,0 +1,233 @@
+# services/cache.py
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш в памяти процесса с ограничением по числу записей
+    и необязательным временем жизни (ttl, сек) — по умолчанию или на запись.
+
+    Версионирование: invalidate() увеличивает поколение ключа, и значение,
+    загруженное до инвалидации, уже не попадёт в кэш (get_or_load сравнивает
+    поколение до и после загрузки). Поколение хранится только для ключей, которые
+    сейчас загружаются, и удаляется, когда последняя загрузка ключа закончилась, —
+    ключи, которые только инвалидируют, память не копят.
+    """
+
+    def __init__(self, maxsize: int = 1024, name: str = "cache", ttl: Optional[float] = None):
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        # key -> (expires_at | None, value)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # key -> [поколение, число идущих загрузок]
+        self._loading: Dict[Hashable, List[int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            state = self._loading.setdefault(key, [0, 0])
+            state[1] += 1
+            generation = state[0]
+        try:
+            value = loader()
+        except BaseException:
+            with self._lock:
+                self._finish_load(key)
+            raise
+        with self._lock:
+            if self._finish_load(key) == generation:
+                self._store(key, value)
+        return value
+
+    def _finish_load(self, key: Hashable) -> int:
+        """Снимает загрузку ключа; возвращает текущее поколение. Под self._lock."""
+        state = self._loading[key]
+        state[1] -= 1
+        if not state[1]:
+            del self._loading[key]
+        return state[0]
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            state = self._loading.get(key)
+            if state is not None:
+                state[0] += 1  # идущая загрузка вернёт уже устаревшее значение
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            for state in self._loading.values():
+                state[0] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+
+class SharedFileCache:
+    """
+    Кэш в каталоге на диске (например, /dev/shm/...), общий для всех воркеров
+    gunicorn одной машины. Рассчитан на неизменяемые значения с версией в ключе:
+    инвалидация не нужна, старые версии просто вытесняются.
+    Ограничение по числу файлов; вытесняются давно не читанные (по mtime).
+
+    Значения хранятся в JSON (кортежи и NamedTuple — списками), decode собирает
+    из них исходный тип. Каталог задаётся явно и должен принадлежать пользователю
+    процесса без права записи для группы и остальных: иначе кто-то другой на
+    машине мог бы подложить воркерам своё содержимое.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        name: str = "cache",
+        directory: Optional[str] = None,
+        decode: Optional[Callable[[Any], Any]] = None,
+    ):
+        if not directory:
+            raise ValueError(f"SharedFileCache {name!r}: directory is required")
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.directory = directory
+        self.decode = decode
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self._check_owner(os.stat(self.directory), self.directory)
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _check_owner(st: os.stat_result, path: str) -> None:
+        if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(
+                f"{path} must be owned by uid {os.getuid()} and not writable by group/others"
+            )
+
+    def _path(self, key: Hashable) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".json")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                self._check_owner(os.fstat(f.fileno()), path)
+                value = json.load(f)
+            if self.decode is not None:
+                value = self.decode(value)
+            os.utime(path)
+        except (OSError, ValueError, TypeError):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        path = self._path(key)
+        # mkstemp создаёт файл с правами 0600 независимо от umask — иначе get() его отвергнет
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self._prune()
+
+    def _prune(self) -> None:
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        except OSError:
+            return
+        if len(entries) <= self.maxsize:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for e in entries[: len(entries) - self.maxsize]:
+            try:
+                os.unlink(e.path)
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "directory": self.directory,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+        }
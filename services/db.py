@@ -1,68 +1,106 @@
+import os
+import threading
+from contextlib import suppress
+
 import psycopg
+from psycopg import pq
+from psycopg_pool import ConnectionPool
 from flask import current_app, g
 
-SCHEMA_SQL = """
-CREATE TABLE IF NOT EXISTS users (
-  id SERIAL PRIMARY KEY,
-  email TEXT UNIQUE NOT NULL,
-  username TEXT UNIQUE NOT NULL,
-  password_hash TEXT NOT NULL,
-  role TEXT NOT NULL DEFAULT 'user',
-  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
-);
-
-
-CREATE TABLE IF NOT EXISTS quizzes (
-  id SERIAL PRIMARY KEY,
-  title TEXT NOT NULL,
-  subtitle TEXT,
-  image_path TEXT,
-  created_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
-  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
-);
-
-CREATE TABLE IF NOT EXISTS questions (
-  id SERIAL PRIMARY KEY,
-  quiz_id INTEGER NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
-  text TEXT NOT NULL,
-  position INTEGER NOT NULL DEFAULT 1
-);
-
-CREATE TABLE IF NOT EXISTS options (
-  id SERIAL PRIMARY KEY,
-  question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
-  text TEXT NOT NULL,
-  is_correct BOOLEAN NOT NULL DEFAULT FALSE
-);
-
-CREATE TABLE IF NOT EXISTS results (
-  id SERIAL PRIMARY KEY,
-  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-  quiz_id INTEGER NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
-  score INTEGER NOT NULL,
-  total INTEGER NOT NULL,
-  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
-);
-
-CREATE INDEX IF NOT EXISTS idx_quiz_title ON quizzes (title);
-CREATE INDEX IF NOT EXISTS idx_results_quiz ON results (quiz_id);
-CREATE INDEX IF NOT EXISTS idx_results_user ON results (user_id);
-"""
+from services.metrics import InstrumentedCursor
+
+_pool: ConnectionPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def _configure_conn(conn: psycopg.Connection) -> None:
+    # Модель приложения: одна транзакция на запрос, коммит делают сервисы явно
+    conn.autocommit = False
+    # Счётчики и время запросов для /metrics и журнала медленных запросов
+    conn.cursor_factory = InstrumentedCursor
+
+
+def _check_conn(conn: psycopg.Connection) -> None:
+    # То же, что ConnectionPool.check_connection, но простым курсором: проверка
+    # при выдаче из пула — не SQL приложения и не входит в счёт запросов маршрута
+    conn.autocommit = True
+    try:
+        psycopg.Cursor(conn).execute("")
+    finally:
+        with suppress(Exception):
+            conn.autocommit = False
+
+
+def _reset_conn(conn: psycopg.Connection) -> None:
+    # Соединение возвращается в пул без незавершённой транзакции
+    if conn.info.transaction_status != pq.TransactionStatus.IDLE:
+        conn.rollback()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Пул соединений текущего процесса.
+    Создаётся лениво: под gunicorn каждый воркер после fork открывает свой пул.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            cfg = current_app.config
+            _pool = ConnectionPool(
+                cfg["DATABASE_URL"],
+                min_size=cfg["DB_POOL_MIN_SIZE"],
+                max_size=cfg["DB_POOL_MAX_SIZE"],
+                timeout=cfg["DB_POOL_TIMEOUT"],
+                max_lifetime=cfg["DB_POOL_MAX_LIFETIME"],
+                max_idle=cfg["DB_POOL_MAX_IDLE"],
+                configure=_configure_conn,
+                reset=_reset_conn,
+                check=_check_conn,
+                name=f"quizdb-{pid}",
+                open=True,
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+        _pool_pid = None
+
+
+def get_pool_stats() -> dict:
+    """
+    Метрики пула: размер, ожидание соединения (requests_wait_ms),
+    таймауты, отброшенные при проверке соединения и т.д.
+    """
+    if _pool is None or _pool_pid != os.getpid():
+        return {}
+    return _pool.get_stats()
+
 
 def get_db():
-    """Возвращает соединение psycopg, хранится в g (одно на запрос)."""
+    """Возвращает соединение psycopg из пула, хранится в g (одно на запрос)."""
     if "db" not in g:
-        g.db = psycopg.connect(current_app.config["DATABASE_URL"])
-        g.db.autocommit = False
+        g.db = get_pool().getconn()
     return g.db
 
 def close_db(_e=None):
     db = g.pop("db", None)
-    if db is not None:
-        db.close()
-
-def init_db():
-    db = get_db()
-    with db.cursor() as cur:
-        cur.execute(SCHEMA_SQL)
-    db.commit()
+    if db is None:
+        return
+    # Всё, что не закоммичено за запрос, откатывается перед возвратом в пул
+    try:
+        if not db.closed and db.info.transaction_status != pq.TransactionStatus.IDLE:
+            db.rollback()
+    except psycopg.Error:
+        pass
+    get_pool().putconn(db)
@@ -0,0 +1,171 @@
+# services/images.py
+"""
+Производные картинок: уменьшенные копии в исходном формате и в WebP.
+
+Генерация идёт в фоновом пуле потоков после сохранения викторины; готовые пути
+записываются в image_variants строк quizzes/questions с этим image_path:
+    {"webp": {"320": "uploads/quizzes/variants/<sha>_320.webp", ..., "1600": "..._1600.webp"},
+     "png":  {"320": "uploads/quizzes/variants/<sha>_320.png", ..., "1600": "uploads/quizzes/<sha>.png"}}
+Последняя ширина — собственная ширина исходника: в исходном формате это сам
+исходный файл, в WebP — его копия без уменьшения. Так в srcset всегда есть
+кандидат не уже оригинала, и браузеру не приходится растягивать мелкую копию.
+Пока варианты не готовы (или нет Pillow), шаблоны показывают исходный файл.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from flask import Flask, current_app
+from psycopg.types.json import Jsonb
+
+from services.db import get_db
+from services.response_cache import invalidate_pages
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow — необязательная зависимость
+    Image = None
+
+log = logging.getLogger(__name__)
+
+VARIANTS_DIR = "variants"
+
+_SAVE_OPTIONS = {
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+    "png": {"format": "PNG", "optimize": True},
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app: Flask) -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=app.config["IMAGE_WORKERS"], thread_name_prefix="image-variants"
+                )
+    return _executor
+
+
+def variants_folder() -> Path:
+    return Path(current_app.config["UPLOAD_FOLDER"]) / VARIANTS_DIR
+
+
+def variant_files(image_path: str) -> List[Path]:
+    """Файлы производных данной картинки (для уборки вместе с исходником)."""
+    stem = Path(image_path).stem
+    folder = variants_folder()
+    return sorted(folder.glob(f"{stem}_*")) if folder.is_dir() else []
+
+
+def build_variants(image_path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Делает уменьшенные копии (ширины из IMAGE_VARIANT_WIDTHS, только меньше исходной)
+    в исходном формате и в WebP, плюс исходник в полную ширину. Возвращает словарь
+    для image_variants.
+    """
+    if Image is None:
+        return {}
+
+    static = Path(current_app.static_folder)
+    source = static / image_path
+    folder = variants_folder()
+    folder.mkdir(parents=True, exist_ok=True)
+
+    ext = source.suffix.lstrip(".").lower()
+    fmt = "jpeg" if ext in ("jpg", "jpeg") else ext
+    formats = [fmt, "webp"] if fmt != "webp" else ["webp"]
+
+    variants: Dict[str, Dict[str, str]] = {f: {} for f in formats}
+    with Image.open(source) as img:
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        base = img.convert("RGBA" if has_alpha else "RGB")
+
+    widths = sorted(w for w in current_app.config["IMAGE_VARIANT_WIDTHS"] if w < base.width)
+    for width in widths + [base.width]:
+        if width == base.width:
+            resized = base
+            variants[fmt][str(width)] = image_path  # сам исходник, без копии
+        else:
+            height = max(1, round(base.height * width / base.width))
+            resized = base.resize((width, height), Image.LANCZOS)
+        for f in formats:
+            if str(width) in variants[f]:
+                continue
+            out_img = resized.convert("RGB") if f == "jpeg" else resized
+            name = f"{source.stem}_{width}.{'jpg' if f == 'jpeg' else f}"
+            target = folder / name
+            if not target.exists():
+                tmp = target.with_suffix(target.suffix + ".part")
+                out_img.save(tmp, **_SAVE_OPTIONS[f])
+                tmp.replace(target)
+            variants[f][str(width)] = target.relative_to(static).as_posix()
+
+    return {f: v for f, v in variants.items() if v}
+
+
+def _store_variants(image_path: str, variants: Dict[str, Dict[str, str]]) -> None:
+    """Записывает пути вариантов всем строкам с этим image_path и повышает version викторин."""
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            "UPDATE quizzes SET image_variants=%s, version = version + 1 WHERE image_path=%s RETURNING id",
+            (Jsonb(variants), image_path),
+        )
+        quiz_ids = {r[0] for r in cur.fetchall()}
+        cur.execute(
+            "UPDATE questions SET image_variants=%s WHERE image_path=%s RETURNING quiz_id",
+            (Jsonb(variants), image_path),
+        )
+        question_quiz_ids = {r[0] for r in cur.fetchall()} - quiz_ids
+        if question_quiz_ids:
+            cur.execute(
+                "UPDATE quizzes SET version = version + 1 WHERE id = ANY(%s)",
+                (sorted(question_quiz_ids),),
+            )
+    db.commit()
+    invalidate_pages("catalog", *(f"quiz:{qid}" for qid in quiz_ids | question_quiz_ids))
+
+
+def _run(app: Flask, image_path: str) -> None:
+    with app.app_context():
+        try:
+            # пустой словарь тоже сохраняем: картинка меньше всех ширин, делать нечего
+            _store_variants(image_path, build_variants(image_path))
+        except Exception:
+            log.exception("image variants failed for %s", image_path)
+            raise
+
+
+def schedule_variants(image_paths: Iterable[Optional[str]]) -> List[Future]:
+    """Ставит генерацию производных в фоновый пул; без Pillow ничего не делает."""
+    if Image is None:
+        log.warning("Pillow is not installed, image variants are disabled")
+        return []
+    app = current_app._get_current_object()
+    executor = _get_executor(app)
+    return [executor.submit(_run, app, p) for p in dict.fromkeys(p for p in image_paths if p)]
+
+
+def pending_variant_sources() -> List[str]:
+    """Картинки, для которых ещё нет производных (для досчёта старых загрузок)."""
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            SELECT image_path FROM quizzes WHERE image_path IS NOT NULL AND image_variants IS NULL
+            UNION
+            SELECT image_path FROM questions WHERE image_path IS NOT NULL AND image_variants IS NULL
+            """
+        )
+        paths = [r[0] for r in cur.fetchall()]
+    db.rollback()
+    return paths
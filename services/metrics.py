@@ -0,0 +1,323 @@
+# services/metrics.py
+"""
+Метрики запросов и SQL в формате Prometheus (GET /metrics).
+
+- InstrumentedCursor — cursor_factory соединений пула (services.db): считает и
+  замеряет каждый execute/executemany, пишет в лог запросы дольше SLOW_QUERY_MS
+  и копит счётчики текущего запроса в g (request_query_stats).
+- init_metrics(app) — латентность маршрутов по endpoint, число SQL на запрос.
+
+Эндпоинт включается METRICS_ENABLED и вне debug требует METRICS_TOKEN.
+
+Метрики живут в памяти процесса. Под gunicorn с несколькими воркерами задайте
+METRICS_DIR: каждый воркер раз в секунду сбрасывает туда снимок, а /metrics
+складывает снимки всех воркеров.
+"""
+from __future__ import annotations
+
+import bisect
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import psycopg
+from flask import Flask, Response, abort, current_app, g, has_app_context, request
+
+from services.query_debug import record_statement
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+# Как часто воркер сбрасывает снимок в METRICS_DIR, сек
+SNAPSHOT_INTERVAL = 1.0
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {json.dumps(k): _copy(v) for k, v in self._values.items()}
+
+
+def _copy(v: Any) -> Any:
+    return [list(v[0]), v[1], v[2]] if isinstance(v, list) else v
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    @staticmethod
+    def merge(a: Any, b: Any) -> Any:
+        return a + b
+
+    def lines(self, values: Dict[Tuple[str, ...], Any]) -> Iterable[str]:
+        for labels, v in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...], labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # [счётчики по корзинам (последняя — +Inf), сумма, число]
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @staticmethod
+    def merge(a: Any, b: Any) -> Any:
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    def lines(self, values: Dict[Tuple[str, ...], Any]) -> Iterable[str]:
+        for labels, (counts, total, n) in sorted(values.items()):
+            acc = 0
+            for le, c in zip((*self.buckets, "+Inf"), counts):
+                acc += c
+                yield f"{self.name}_bucket{_labels((*self.labelnames, 'le'), (*labels, _num(le)))} {acc}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {n}"
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _num(v: Any) -> str:
+    if isinstance(v, str):
+        return v
+    if isinstance(v, float) and not v.is_integer():
+        return repr(v)
+    return str(int(v))
+
+
+REQUESTS = Counter("quiz_http_requests_total", "HTTP requests", ("endpoint", "method", "status"))
+REQUEST_LATENCY = Histogram(
+    "quiz_http_request_duration_seconds", "Request latency by endpoint", LATENCY_BUCKETS, ("endpoint",)
+)
+REQUEST_QUERIES = Histogram(
+    "quiz_db_queries_per_request", "SQL statements executed per request", COUNT_BUCKETS, ("endpoint",)
+)
+QUERY_LATENCY = Histogram("quiz_db_query_duration_seconds", "SQL statement latency", QUERY_BUCKETS)
+SLOW_QUERIES = Counter("quiz_db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS")
+
+_REGISTRY: List[_Metric] = [REQUESTS, REQUEST_LATENCY, REQUEST_QUERIES, QUERY_LATENCY, SLOW_QUERIES]
+
+
+# =========================
+# SQL
+# =========================
+
+class RequestQueries:
+    """Счётчики SQL текущего запроса (или app context фоновой задачи)."""
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+def request_query_stats() -> RequestQueries:
+    stats = g.get("_db_queries")
+    if stats is None:
+        stats = g._db_queries = RequestQueries()
+    return stats
+
+
+@contextmanager
+def untracked_queries() -> Iterator[None]:
+    """
+    Служебные запросы блока (проверка схемы при первом запросе воркера) не входят
+    в счёт SQL текущего запроса: ни в quiz_db_queries_per_request, ни в бюджеты.
+    """
+    previous = g.get("_untracked_queries", False)
+    g._untracked_queries = True
+    try:
+        yield
+    finally:
+        g._untracked_queries = previous
+
+
+def _query_text(cur: psycopg.Cursor, query: Any) -> str:
+    if isinstance(query, bytes):
+        return query.decode("utf-8", "replace")
+    if isinstance(query, str):
+        return query
+    try:
+        return query.as_string(cur)
+    except Exception:
+        return repr(query)
+
+
+def observe_query(cur: psycopg.Cursor, query: Any, seconds: float) -> None:
+    QUERY_LATENCY.observe(seconds)
+    if not has_app_context() or g.get("_untracked_queries"):
+        return
+
+    stats = request_query_stats()
+    stats.count += 1
+    stats.seconds += seconds
+    if current_app.config.get("QUERY_DEBUG"):
+        record_statement(_query_text(cur, query))
+
+    threshold = current_app.config.get("SLOW_QUERY_MS") or 0
+    if threshold and seconds * 1000 >= threshold:
+        SLOW_QUERIES.inc()
+        log.warning("slow query %.1f ms: %s", seconds * 1000, " ".join(_query_text(cur, query).split())[:1000])
+
+
+class InstrumentedCursor(psycopg.Cursor):
+    """Курсор, замеряющий каждый запрос (execute / executemany) — см. observe_query."""
+
+    def execute(self, query, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, *args, **kwargs)
+        finally:
+            observe_query(self, query, time.perf_counter() - t0)
+
+    def executemany(self, query, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(query, *args, **kwargs)
+        finally:
+            observe_query(self, query, time.perf_counter() - t0)
+
+
+# =========================
+# Export
+# =========================
+
+_last_snapshot = 0.0
+
+
+def _write_snapshot(directory: str) -> None:
+    global _last_snapshot
+    now = time.monotonic()
+    if now - _last_snapshot < SNAPSHOT_INTERVAL:
+        return
+    _last_snapshot = now
+
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    tmp = path / f".{os.getpid()}.tmp"
+    tmp.write_text(json.dumps({m.name: m.snapshot() for m in _REGISTRY}))
+    tmp.replace(path / f"{os.getpid()}.json")
+
+
+def _collect(directory: Optional[str]) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+    """Значения метрик этого процесса плюс снимки остальных воркеров из METRICS_DIR."""
+    snapshots = [{m.name: m.snapshot() for m in _REGISTRY}]
+    if directory and os.path.isdir(directory):
+        own = f"{os.getpid()}.json"
+        for p in Path(directory).glob("*.json"):
+            if p.name == own:
+                continue
+            try:
+                snapshots.append(json.loads(p.read_text()))
+            except (OSError, ValueError):
+                continue
+
+    merged: Dict[str, Dict[Tuple[str, ...], Any]] = {m.name: {} for m in _REGISTRY}
+    by_name = {m.name: m for m in _REGISTRY}
+    for snap in snapshots:
+        for name, values in snap.items():
+            metric = by_name.get(name)
+            if metric is None:
+                continue
+            for key, v in values.items():
+                labels = tuple(json.loads(key))
+                cur = merged[name].get(labels)
+                merged[name][labels] = v if cur is None else metric.merge(cur, v)
+    return merged
+
+
+def render_metrics(gauges: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """
+    Текст для Prometheus. gauges — {компонент: словарь stats()} текущего процесса
+    (пул, кэши); числовые поля выводятся как quiz_<компонент>_<поле>.
+    """
+    values = _collect(current_app.config.get("METRICS_DIR"))
+    out: List[str] = []
+    for m in _REGISTRY:
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        out.extend(m.lines(values[m.name]))
+
+    for component, stats in (gauges or {}).items():
+        for key, v in sorted((stats or {}).items()):
+            if isinstance(v, bool) or not isinstance(v, (int, float)):
+                continue
+            name = f"quiz_{component}_{key}"
+            out.append(f"# TYPE {name} gauge")
+            out.append(f'{name}{{pid="{os.getpid()}"}} {_num(v)}')
+    return "\n".join(out) + "\n"
+
+
+def init_metrics(app: Flask) -> None:
+    if not app.config["METRICS_ENABLED"]:
+        return
+
+    @app.before_request
+    def _metrics_start():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record(response):
+        started = g.pop("_request_started", None)
+        if started is not None:
+            endpoint = request.endpoint or "unmatched"
+            REQUESTS.inc(endpoint, request.method, str(response.status_code))
+            REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint)
+            REQUEST_QUERIES.observe(request_query_stats().count, endpoint)
+        directory = app.config.get("METRICS_DIR")
+        if directory:
+            _write_snapshot(directory)
+        return response
+
+
+def metrics_response(gauges: Optional[Dict[str, Dict[str, Any]]] = None) -> Response:
+    """Страница /metrics; без METRICS_TOKEN — только в debug / testing."""
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token:
+        if not (current_app.debug or current_app.testing):
+            abort(403)
+    elif not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(403)
+    return Response(render_metrics(gauges), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,291 @@
+# services/migrations.py
+"""
+Версионированные миграции схемы.
+
+Применяются один раз при деплое командой `flask db-upgrade`;
+воркеры при старте только сверяют версию (check_schema) и никогда не выполняют DDL.
+Новая миграция — новый элемент в конце MIGRATIONS со следующим номером.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple
+
+from services.db import get_db
+
+# Ключ advisory lock, чтобы два параллельных деплоя не применяли миграции одновременно
+_LOCK_KEY = 7_240_311
+
+MIGRATIONS: List[Tuple[int, str, str]] = [
+    (
+        1,
+        "baseline",
+        """
+        CREATE TABLE IF NOT EXISTS users (
+          id SERIAL PRIMARY KEY,
+          email TEXT UNIQUE NOT NULL,
+          username TEXT UNIQUE NOT NULL,
+          password_hash TEXT NOT NULL,
+          role TEXT NOT NULL DEFAULT 'user',
+          created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+
+        CREATE TABLE IF NOT EXISTS quizzes (
+          id SERIAL PRIMARY KEY,
+          title TEXT NOT NULL,
+          subtitle TEXT,
+          image_path TEXT,
+          created_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
+          created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+
+        CREATE TABLE IF NOT EXISTS questions (
+          id SERIAL PRIMARY KEY,
+          quiz_id INTEGER NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
+          text TEXT NOT NULL,
+          position INTEGER NOT NULL DEFAULT 1
+        );
+
+        CREATE TABLE IF NOT EXISTS options (
+          id SERIAL PRIMARY KEY,
+          question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+          text TEXT NOT NULL,
+          is_correct BOOLEAN NOT NULL DEFAULT FALSE
+        );
+
+        CREATE TABLE IF NOT EXISTS results (
+          id SERIAL PRIMARY KEY,
+          user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+          quiz_id INTEGER NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
+          score INTEGER NOT NULL,
+          total INTEGER NOT NULL,
+          created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+
+        -- Столбцы, которыми код пользуется, но которых не было в исходной схеме
+        ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS image_path TEXT;
+        ALTER TABLE questions ADD COLUMN IF NOT EXISTS image_path TEXT;
+        ALTER TABLE questions ADD COLUMN IF NOT EXISTS explanation TEXT;
+        ALTER TABLE results ADD COLUMN IF NOT EXISTS duration_seconds INTEGER;
+        ALTER TABLE results ADD COLUMN IF NOT EXISTS points INTEGER NOT NULL DEFAULT 0;
+
+        CREATE INDEX IF NOT EXISTS idx_quiz_title ON quizzes (title);
+        CREATE INDEX IF NOT EXISTS idx_results_quiz ON results (quiz_id);
+        CREATE INDEX IF NOT EXISTS idx_results_user ON results (user_id);
+        CREATE INDEX IF NOT EXISTS idx_questions_quiz ON questions (quiz_id, position, id);
+        CREATE INDEX IF NOT EXISTS idx_options_question ON options (question_id, id);
+        """,
+    ),
+    (
+        2,
+        "results_quiz_rank_index",
+        """
+        -- Порядок попыток внутри викторины: points DESC NULLS LAST,
+        -- duration_seconds ASC NULLS LAST, created_at ASC (id — для однозначности).
+        -- Ключ записан выражениями по возрастанию, чтобы "строго лучше" было одним
+        -- диапазоном индекса (сравнение кортежей) — см. quiz.get_result_rank_in_quiz.
+        CREATE INDEX IF NOT EXISTS idx_results_quiz_rank ON results (
+          quiz_id,
+          (-COALESCE(points, -2147483647)),
+          (COALESCE(duration_seconds, 2147483647)),
+          created_at,
+          id
+        );
+        """,
+    ),
+    (
+        3,
+        "user_stats",
+        """
+        -- Агрегаты игроков для общего рейтинга; обновляются в quiz.save_result,
+        -- пересчитываются в quiz.delete_quiz и quiz.rebuild_leaderboard.
+        CREATE TABLE IF NOT EXISTS user_stats (
+          user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+          total_score INTEGER NOT NULL DEFAULT 0,
+          total_points BIGINT NOT NULL DEFAULT 0,
+          attempts INTEGER NOT NULL DEFAULT 0,
+          best_points INTEGER NOT NULL DEFAULT 0,
+          updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_user_stats_score ON user_stats (total_score DESC, user_id);
+
+        INSERT INTO user_stats (user_id, total_score, total_points, attempts, best_points)
+        SELECT user_id, SUM(score), COALESCE(SUM(points), 0), COUNT(*), COALESCE(MAX(points), 0)
+        FROM results
+        GROUP BY user_id
+        ON CONFLICT (user_id) DO NOTHING;
+        """,
+    ),
+    (
+        4,
+        "quiz_search",
+        """
+        -- Поиск по викторинам: полнотекстовый (русская морфология, title важнее subtitle)
+        -- и триграммный — для поиска по части слова, как раньше с ILIKE.
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+        ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS search_tsv tsvector
+          GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(subtitle, '')), 'B')
+          ) STORED;
+
+        CREATE INDEX IF NOT EXISTS idx_quizzes_search_tsv ON quizzes USING GIN (search_tsv);
+        CREATE INDEX IF NOT EXISTS idx_quizzes_title_trgm ON quizzes USING GIN (title gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_quizzes_subtitle_trgm ON quizzes USING GIN (subtitle gin_trgm_ops);
+        """,
+    ),
+    (
+        5,
+        "quiz_catalog_index",
+        """
+        -- Каталог викторин (публичный и админка): курсорная пагинация по (created_at, id)
+        CREATE INDEX IF NOT EXISTS idx_quizzes_created ON quizzes (created_at DESC, id DESC);
+        """,
+    ),
+    (
+        6,
+        "quiz_version",
+        """
+        -- Версия содержимого викторины: растёт при каждой правке в админке,
+        -- ключ кэша содержимого — (id, version), см. quiz.get_quiz_content.
+        ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+        """,
+    ),
+    (
+        7,
+        "image_path_indexes",
+        """
+        -- Подсчёт ссылок на файлы загрузок (uploads.upload_refcount)
+        CREATE INDEX IF NOT EXISTS idx_quizzes_image_path ON quizzes (image_path) WHERE image_path IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_questions_image_path ON questions (image_path) WHERE image_path IS NOT NULL;
+        """,
+    ),
+    (
+        8,
+        "image_variants",
+        """
+        -- Пути уменьшенных копий / WebP картинки (services.images)
+        ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS image_variants JSONB;
+        ALTER TABLE questions ADD COLUMN IF NOT EXISTS image_variants JSONB;
+        """,
+    ),
+    (
+        9,
+        "results_client_token",
+        """
+        -- Ключ идемпотентности попытки: повторный сброс очереди результатов
+        -- (services.result_queue) не создаёт дублей, см. quiz.insert_results.
+        ALTER TABLE results ADD COLUMN IF NOT EXISTS client_token UUID;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_results_client_token ON results (client_token);
+        """,
+    ),
+    (
+        10,
+        "image_variants_full_width",
+        """
+        -- В image_variants теперь есть и исходник в полную ширину (services.images);
+        -- старые наборы без него пересобирает `flask images-derive`.
+        UPDATE quizzes SET image_variants = NULL WHERE image_variants IS NOT NULL;
+        UPDATE questions SET image_variants = NULL WHERE image_variants IS NOT NULL;
+        """,
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+class SchemaOutdatedError(RuntimeError):
+    pass
+
+
+def _ensure_version_table(cur) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          version INTEGER PRIMARY KEY,
+          name TEXT NOT NULL,
+          applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    )
+
+
+def current_version() -> int:
+    """Версия схемы в базе; 0 — миграции ещё не применялись. Один дешёвый запрос."""
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            SELECT CASE WHEN to_regclass('schema_migrations') IS NULL THEN 0
+                        ELSE (SELECT COALESCE(MAX(version), 0) FROM schema_migrations)
+                   END
+            """
+        )
+        version = cur.fetchone()[0]
+    db.rollback()
+    return int(version)
+
+
+def migrate() -> List[Tuple[int, str]]:
+    """
+    Применяет недостающие миграции, каждую в своей транзакции.
+    Возвращает список применённых (version, name).
+    """
+    db = get_db()
+    applied: List[Tuple[int, str]] = []
+
+    with db.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_KEY,))
+    try:
+        with db.cursor() as cur:
+            _ensure_version_table(cur)
+            db.commit()
+
+            cur.execute("SELECT version FROM schema_migrations")
+            done = {r[0] for r in cur.fetchall()}
+
+            for version, name, sql in MIGRATIONS:
+                if version in done:
+                    continue
+                cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name),
+                )
+                db.commit()
+                applied.append((version, name))
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        with db.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+        db.commit()
+
+    return applied
+
+
+def migration_status() -> List[Dict[str, Any]]:
+    applied = {}
+    if current_version():
+        db = get_db()
+        with db.cursor() as cur:
+            cur.execute("SELECT version, applied_at FROM schema_migrations")
+            applied = dict(cur.fetchall())
+        db.rollback()
+
+    return [
+        {"version": v, "name": name, "applied_at": applied.get(v)}
+        for v, name, _ in MIGRATIONS
+    ]
+
+
+def check_schema() -> None:
+    """Проверка при старте воркера: схема не старее кода. Без DDL."""
+    version = current_version()
+    if version < LATEST_VERSION:
+        raise SchemaOutdatedError(
+            f"Database schema is at version {version}, code expects {LATEST_VERSION}. "
+            "Run `flask db-upgrade`."
+        )
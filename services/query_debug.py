@@ -0,0 +1,147 @@
+# services/query_debug.py
+"""
+Отладочный детектор N+1 (QUERY_DEBUG=1, только для разработки и тестов).
+
+Каждый SQL текущего запроса сводится к отпечатку (литералы -> ?, пробелы
+схлопнуты) и запоминается вместе с сервисной функцией, которая его выполнила.
+После ответа:
+- отпечатки, повторённые не меньше N_PLUS_ONE_THRESHOLD раз, пишутся в лог
+  как вероятный N+1 с местом вызова;
+- число запросов сравнивается с бюджетом маршрута (@query_budget(n) или
+  QUERY_BUDGET); при QUERY_BUDGET_STRICT превышение — исключение
+  QueryBudgetExceeded, и тест на маршрут падает.
+
+В ответ добавляются заголовки X-Query-Count и X-Query-Repeats.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import sys
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from flask import Flask, current_app, g, request
+
+log = logging.getLogger(__name__)
+
+_INTERNAL_MODULES = ("services.db", "services.metrics", "services.query_debug")
+
+_COMMENT_RE = re.compile(r"--[^\n]*")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql: str) -> str:
+    """Нормализованный текст запроса: одинаковый для вызовов с разными значениями."""
+    sql = _COMMENT_RE.sub(" ", sql)
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _LIST_RE.sub("(?...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip().lower()
+
+
+def _caller() -> str:
+    """Первая функция сервисного слоя (или приложения) в стеке над курсором."""
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith("psycopg") and module not in _INTERNAL_MODULES:
+            where = f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+            if module.startswith("services."):
+                return where
+            fallback = fallback or where
+        frame = frame.f_back
+    return fallback or "?"
+
+
+def _statements() -> Dict[str, Dict[str, Any]]:
+    stmts = g.get("_query_fingerprints")
+    if stmts is None:
+        stmts = g._query_fingerprints = {}
+    return stmts
+
+
+def record_statement(sql: str) -> None:
+    entry = _statements().setdefault(fingerprint(sql), {"count": 0, "callers": {}})
+    entry["count"] += 1
+    caller = _caller()
+    entry["callers"][caller] = entry["callers"].get(caller, 0) + 1
+
+
+def repeated_statements(threshold: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Отпечатки, выполненные за запрос не меньше threshold раз (по убыванию)."""
+    if threshold is None:
+        threshold = current_app.config["N_PLUS_ONE_THRESHOLD"]
+    return sorted(
+        (
+            {"fingerprint": fp, "count": e["count"], "callers": e["callers"]}
+            for fp, e in _statements().items()
+            if e["count"] >= threshold
+        ),
+        key=lambda r: -r["count"],
+    )
+
+
+def statement_count() -> int:
+    return sum(e["count"] for e in _statements().values())
+
+
+def query_budget(n: int):
+    """Бюджет SQL маршрута: @app.route(...) / @query_budget(3) / def view()."""
+    def decorator(view):
+        view._query_budget = n
+        return view
+    return decorator
+
+
+def _check(budget: Optional[int], where: str) -> None:
+    count = statement_count()
+    for r in repeated_statements():
+        callers = ", ".join(f"{c} x{n}" for c, n in r["callers"].items())
+        log.warning("possible N+1 in %s: %d x %s [%s]", where, r["count"], r["fingerprint"][:200], callers)
+
+    if budget and count > budget:
+        message = f"{where}: {count} queries, budget {budget}"
+        if current_app.config["QUERY_BUDGET_STRICT"]:
+            raise QueryBudgetExceeded(message)
+        log.warning("query budget exceeded, %s", message)
+
+
+@contextmanager
+def max_queries(n: int, label: str = "block") -> Iterator[None]:
+    """Бюджет для куска кода вне маршрута (например, вызова сервиса в тесте)."""
+    outer = g.pop("_query_fingerprints", None) or {}
+    try:
+        yield
+        _check(n, label)
+    finally:
+        # запросы блока остаются в счёте объемлющего маршрута
+        inner = g.pop("_query_fingerprints", None) or {}
+        for fp, e in inner.items():
+            entry = outer.setdefault(fp, {"count": 0, "callers": {}})
+            entry["count"] += e["count"]
+            for caller, k in e["callers"].items():
+                entry["callers"][caller] = entry["callers"].get(caller, 0) + k
+        g._query_fingerprints = outer
+
+
+def init_query_debug(app: Flask) -> None:
+    if not app.config["QUERY_DEBUG"]:
+        return
+
+    @app.after_request
+    def _query_report(response):
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, "_query_budget", None) or app.config["QUERY_BUDGET"]
+        response.headers["X-Query-Count"] = str(statement_count())
+        response.headers["X-Query-Repeats"] = str(len(repeated_statements()))
+        _check(budget, f"{request.method} {request.endpoint}")
+        return response
@@ -1,98 +1,376 @@
 # services/quiz.py
 from __future__ import annotations
 
-from typing import Optional, Dict, Any, List, Tuple
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, Any, List, NamedTuple, Tuple
 
+import psycopg
+from flask import current_app
+from werkzeug.utils import import_string
+
+from services.cache import LRUCache, SharedFileCache
 from services.db import get_db
+from services.response_cache import invalidate_pages
+from services.uploads import release_uploads
+
+_answer_keys: Optional[LRUCache] = None
+_quiz_contents = None
+_group_commit = None
+
+
+# Неизменяемое представление содержимого викторины для кэша (ключ — id + version).
+# Поля совпадают с ключами словарей get_quiz / get_quiz_questions_with_options,
+# поэтому шаблоны работают с ним напрямую.
+class OptionContent(NamedTuple):
+    id: int
+    text: str
+
+
+class QuestionContent(NamedTuple):
+    id: int
+    text: str
+    position: int
+    image_path: Optional[str]
+    explanation: Optional[str]
+    options: Tuple[OptionContent, ...]
+    image_variants: Optional[Dict[str, Dict[str, str]]] = None
+
+
+class QuizContent(NamedTuple):
+    id: int
+    version: int
+    title: str
+    subtitle: Optional[str]
+    image_path: Optional[str]
+    questions: Tuple[QuestionContent, ...]
+    image_variants: Optional[Dict[str, Dict[str, str]]] = None
 
 
 # =========================
 # Public (user) functions
 # =========================
 
-def search_quizzes(q: str = "") -> List[Dict[str, Any]]:
+def _like_pattern(q: str) -> str:
+    """Подстрока для ILIKE с экранированием спецсимволов."""
+    return "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def search_quizzes(q: str = "", limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+    """
+    Поиск по названию и описанию: полнотекстовый (search_tsv, русская морфология)
+    плюс совпадение по части слова через триграммные индексы.
+    Сортировка по релевантности, затем по новизне.
+    """
     db = get_db()
     q = (q or "").strip()
 
     with db.cursor() as cur:
         if q:
+            like = _like_pattern(q)
             cur.execute(
                 """
-                SELECT id, title, subtitle, image_path
-                FROM quizzes
-                WHERE title ILIKE %s
-                ORDER BY created_at DESC
+                SELECT id, title, subtitle, image_path, image_variants
+                FROM quizzes, websearch_to_tsquery('russian', %s) AS query
+                WHERE search_tsv @@ query
+                   OR title ILIKE %s
+                   OR subtitle ILIKE %s
+                ORDER BY ts_rank_cd(search_tsv, query) DESC,
+                         similarity(title, %s) DESC,
+                         created_at DESC, id DESC
+                LIMIT %s OFFSET %s
                 """,
-                (f"%{q}%",),
+                (q, like, like, q, limit, offset),
             )
         else:
             cur.execute(
                 """
-                SELECT id, title, subtitle, image_path
+                SELECT id, title, subtitle, image_path, image_variants
                 FROM quizzes
                 ORDER BY created_at DESC
-                """
+                LIMIT %s OFFSET %s
+                """,
+                (limit, offset),
             )
         rows = cur.fetchall()
 
-    return [{"id": r[0], "title": r[1], "subtitle": r[2], "image_path": r[3]} for r in rows]
+    return [
+        {"id": r[0], "title": r[1], "subtitle": r[2], "image_path": r[3], "image_variants": r[4]}
+        for r in rows
+    ]
 
 
-def get_quiz(quiz_id: int) -> Optional[Dict[str, Any]]:
+def encode_catalog_cursor(created_at: datetime, quiz_id: int) -> str:
+    return f"{created_at.isoformat()}~{quiz_id}"
+
+
+def decode_catalog_cursor(cursor: str | None) -> Optional[Tuple[datetime, int]]:
+    """Курсор каталога -> (created_at, id); None для пустого или испорченного курсора."""
+    if not cursor:
+        return None
+    try:
+        ts, _, qid = cursor.rpartition("~")
+        return datetime.fromisoformat(ts), int(qid)
+    except ValueError:
+        return None
+
+
+def _catalog_page(columns: str, cursor: str | None, limit: int) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Страница викторин от новых к старым: keyset по (created_at, id)
+    через idx_quizzes_created. Первый столбец columns — id, последний — created_at.
+    """
+    after = decode_catalog_cursor(cursor)
+    db = get_db()
+    with db.cursor() as cur:
+        if after:
+            cur.execute(
+                f"""
+                SELECT {columns}
+                FROM quizzes
+                WHERE (created_at, id) < (%s, %s)
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+                """,
+                (after[0], after[1], limit + 1),
+            )
+        else:
+            cur.execute(
+                f"""
+                SELECT {columns}
+                FROM quizzes
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+                """,
+                (limit + 1,),
+            )
+        rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_catalog_cursor(rows[-1][-1], rows[-1][0])
+    return rows, next_cursor
+
+
+def list_quizzes(cursor: str | None = None, limit: int = 24) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Публичный каталог постранично.
+    Возвращает (викторины, курсор следующей страницы или None)
+    """
+    rows, next_cursor = _catalog_page("id, title, subtitle, image_path, image_variants, created_at", cursor, limit)
+    return [
+        {"id": r[0], "title": r[1], "subtitle": r[2], "image_path": r[3], "image_variants": r[4]}
+        for r in rows
+    ], next_cursor
+
+
+def _quiz_content_from_json(data: list) -> QuizContent:
+    """QuizContent из JSON файлового кэша, где NamedTuple записаны списками."""
+    *quiz, questions, image_variants = data
+    return QuizContent(
+        *quiz,
+        tuple(
+            QuestionContent(*q[:5], tuple(OptionContent(*o) for o in q[5]), q[6])
+            for q in questions
+        ),
+        image_variants,
+    )
+
+
+def _quiz_content_cache():
+    global _quiz_contents
+    if _quiz_contents is None:
+        cfg = current_app.config
+        backend = cfg.get("QUIZ_CONTENT_CACHE_BACKEND", "memory")
+        size = cfg.get("QUIZ_CONTENT_CACHE_SIZE", 512)
+        if backend == "memory":
+            _quiz_contents = LRUCache(size, name="quiz_content")
+        elif backend == "file":
+            _quiz_contents = SharedFileCache(
+                size, name="quiz_content", directory=cfg.get("QUIZ_CONTENT_CACHE_DIR"), decode=_quiz_content_from_json
+            )
+        else:
+            _quiz_contents = import_string(backend)(size, name="quiz_content")
+    return _quiz_contents
+
+
+def _load_quiz_content(quiz_id: int) -> Optional[QuizContent]:
+    """Собирает викторину с вопросами и вариантами из БД (два запроса)."""
     db = get_db()
+
     with db.cursor() as cur:
         cur.execute(
-            "SELECT id, title, subtitle, image_path FROM quizzes WHERE id=%s",
+            "SELECT id, version, title, subtitle, image_path, image_variants FROM quizzes WHERE id=%s",
             (quiz_id,),
         )
+        quiz = cur.fetchone()
+        if not quiz:
+            return None
+
+        # варианты собираются в JSON-массив на стороне Postgres — один запрос на все вопросы
+        cur.execute(
+            """
+            SELECT q.id, q.text, q.position, q.image_path, q.explanation, q.image_variants,
+                   COALESCE(
+                     json_agg(json_build_object('id', o.id, 'text', o.text) ORDER BY o.id)
+                       FILTER (WHERE o.id IS NOT NULL),
+                     '[]'::json
+                   ) AS options
+            FROM questions q
+            LEFT JOIN options o ON o.question_id = q.id
+            WHERE q.quiz_id=%s
+            GROUP BY q.id
+            ORDER BY q.position ASC, q.id ASC
+            """,
+            (quiz_id,),
+        )
+        rows = cur.fetchall()
+
+    questions = tuple(
+        QuestionContent(qid, qtext, pos, qimg, qexp, tuple(OptionContent(o["id"], o["text"]) for o in opts), qvar)
+        for qid, qtext, pos, qimg, qexp, qvar, opts in rows
+    )
+    return QuizContent(quiz[0], quiz[1], quiz[2], quiz[3], quiz[4], questions, quiz[5])
+
+
+def get_quiz_version(quiz_id: int) -> Optional[int]:
+    """Текущая версия содержимого викторины; None — викторины нет."""
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute("SELECT version FROM quizzes WHERE id=%s", (quiz_id,))
         row = cur.fetchone()
+    return row[0] if row else None
 
-    if not row:
+
+def get_quiz_content(quiz_id: int) -> Optional[QuizContent]:
+    """
+    Содержимое викторины из кэша по ключу (id, version): проверка версии —
+    один запрос по первичному ключу, пересборка — только после правки в админке.
+    """
+    version = get_quiz_version(quiz_id)
+    if version is None:
         return None
 
-    return {"id": row[0], "title": row[1], "subtitle": row[2], "image_path": row[3]}
+    cache = _quiz_content_cache()
+    content = cache.get((quiz_id, version))
+    if content is None:
+        content = _load_quiz_content(quiz_id)
+        if content is not None:
+            cache.set((content.id, content.version), content)
+    return content
+
+
+def quiz_content_cache_stats() -> Dict[str, Any]:
+    return _quiz_content_cache().stats()
+
+
+def get_quiz(quiz_id: int) -> Optional[Dict[str, Any]]:
+    content = get_quiz_content(quiz_id)
+    if not content:
+        return None
+
+    return {
+        "id": content.id,
+        "title": content.title,
+        "subtitle": content.subtitle,
+        "image_path": content.image_path,
+        "image_variants": content.image_variants,
+    }
 
 
 def get_quiz_questions_with_options(quiz_id: int) -> List[Dict[str, Any]]:
-    db = get_db()
+    """
+    Вопросы викторины вместе с вариантами ответов (из кэша содержимого викторины).
+    """
+    content = get_quiz_content(quiz_id)
+    if not content:
+        return []
+
+    return [
+        {
+            "id": q.id,
+            "text": q.text,
+            "position": q.position,
+            "image_path": q.image_path,
+            "image_variants": q.image_variants,
+            "explanation": q.explanation,
+            "options": [{"id": o.id, "text": o.text} for o in q.options],
+        }
+        for q in content.questions
+    ]
+
 
+def _parse_answers(answers: dict) -> Dict[int, int]:
+    """
+    {question_id(str/int): option_id(str/int)} -> {int: int}.
+    Посторонние поля формы (duration_seconds и т.п.) и пустые ответы пропускаются.
+    """
+    parsed: Dict[int, int] = {}
+    for k, v in answers.items():
+        try:
+            parsed[int(k)] = int(v)
+        except (TypeError, ValueError):
+            continue
+    return parsed
+
+
+def _answer_key_cache() -> LRUCache:
+    global _answer_keys
+    if _answer_keys is None:
+        _answer_keys = LRUCache(current_app.config.get("ANSWER_KEY_CACHE_SIZE", 1024), name="answer_keys")
+    return _answer_keys
+
+
+def _load_answer_key(quiz_id: int) -> Dict[int, Optional[int]]:
+    db = get_db()
     with db.cursor() as cur:
         cur.execute(
             """
-            SELECT q.id, q.text, q.position, q.image_path, q.explanation
+            SELECT q.id, o.id
             FROM questions q
+            LEFT JOIN options o ON o.question_id = q.id AND o.is_correct
             WHERE q.quiz_id=%s
-            ORDER BY q.position ASC, q.id ASC
             """,
             (quiz_id,),
         )
-        qrows = cur.fetchall()
+        rows = cur.fetchall()
+    return {qid: oid for qid, oid in rows}
+
+
+def get_answer_key(quiz_id: int) -> Dict[int, Optional[int]]:
+    """
+    Ключ ответов викторины {question_id: correct_option_id} из LRU-кэша процесса.
+    Меняется только через create_quiz / admin_update_quiz / delete_quiz,
+    которые вызывают invalidate_answer_key.
+    """
+    return _answer_key_cache().get_or_load(quiz_id, lambda: _load_answer_key(quiz_id))
+
+
+def invalidate_answer_key(quiz_id: int) -> None:
+    _answer_key_cache().invalidate(quiz_id)
 
-        questions: List[Dict[str, Any]] = []
-        for qid, qtext, pos, qimg, qexp in qrows:
-            cur.execute(
-                """
-                SELECT id, text
-                FROM options
-                WHERE question_id=%s
-                ORDER BY id ASC
-                """,
-                (qid,),
-            )
-            orows = cur.fetchall()
-
-            questions.append(
-                {
-                    "id": qid,
-                    "text": qtext,
-                    "position": pos,
-                    "image_path": qimg,
-                    "explanation": qexp,
-                    "options": [{"id": oid, "text": otext} for oid, otext in orows],
-                }
-            )
 
-    return questions
+def answer_key_cache_stats() -> Dict[str, Any]:
+    return _answer_key_cache().stats()
+
+
+def grade_quiz_detailed(quiz_id: int, answers: dict) -> Tuple[int, int, Dict[int, bool]]:
+    """
+    Проверка ответов по закэшированному ключу — без обращения к БД при попадании.
+    Возвращает (score, total_questions, {question_id: is_correct})
+    """
+    chosen = _parse_answers(answers)
+    key = get_answer_key(quiz_id)
+
+    per_question = {
+        qid: correct is not None and chosen.get(qid) == correct
+        for qid, correct in key.items()
+    }
+    score = sum(per_question.values())
+    return score, len(per_question), per_question
 
 
 def grade_quiz(quiz_id: int, answers: dict) -> Tuple[int, int]:
@@ -100,38 +378,213 @@ def grade_quiz(quiz_id: int, answers: dict) -> Tuple[int, int]:
     answers: {question_id(str/int): option_id(str/int)}
     Возвращает (score, total_questions)
     """
-    db = get_db()
+    score, total, _ = grade_quiz_detailed(quiz_id, answers)
+    return score, total
 
-    with db.cursor() as cur:
-        cur.execute("SELECT id FROM questions WHERE quiz_id=%s", (quiz_id,))
-        qids = [r[0] for r in cur.fetchall()]
 
-        total = len(qids)
-        score = 0
+# =========================
+# Results / leaderboard
+# =========================
+
+class ResultRow(NamedTuple):
+    """Попытка к записи в results; token — ключ идемпотентности (results.client_token)."""
+    user_id: int
+    quiz_id: int
+    score: int
+    total: int
+    duration_seconds: Optional[int]
+    points: int
+    created_at: Optional[datetime] = None
+    token: Optional[str] = None
+
 
-        for qid in qids:
-            chosen = answers.get(str(qid)) or answers.get(qid)
-            if not chosen:
-                continue
+def insert_results(rows: List[ResultRow], commit: bool = True) -> List[int]:
+    """
+    Вставляет попытки одним INSERT ... SELECT FROM unnest и обновляет user_stats.
+    Возвращает id в порядке rows. Строка с уже записанным token не вставляется
+    повторно (и не учитывается в user_stats) — возвращается id существующей.
+    """
+    if not rows:
+        return []
+    rows = [r if r.token else r._replace(token=str(uuid.uuid4())) for r in rows]
+    cols = list(zip(*rows))
 
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            WITH ins AS (
+              INSERT INTO results (user_id, quiz_id, score, total, duration_seconds, points,
+                                   created_at, client_token)
+              SELECT u.user_id, u.quiz_id, u.score, u.total, u.duration_seconds, u.points,
+                     COALESCE(u.created_at, now()), u.token
+              FROM unnest(%s::int[], %s::int[], %s::int[], %s::int[], %s::int[], %s::int[],
+                          %s::timestamptz[], %s::uuid[])
+                   AS u(user_id, quiz_id, score, total, duration_seconds, points, created_at, token)
+              ON CONFLICT (client_token) DO NOTHING
+              RETURNING id, user_id, score, points, client_token
+            ), stats AS (
+              INSERT INTO user_stats (user_id, total_score, total_points, attempts, best_points)
+              SELECT user_id, SUM(score), SUM(COALESCE(points, 0)), COUNT(*), MAX(COALESCE(points, 0))
+              FROM ins
+              GROUP BY user_id
+              ON CONFLICT (user_id) DO UPDATE SET
+                total_score = user_stats.total_score + EXCLUDED.total_score,
+                total_points = user_stats.total_points + EXCLUDED.total_points,
+                attempts = user_stats.attempts + EXCLUDED.attempts,
+                best_points = GREATEST(user_stats.best_points, EXCLUDED.best_points),
+                updated_at = now()
+            )
+            SELECT client_token::text, id FROM ins
+            UNION ALL
+            SELECT client_token::text, id FROM results
+            WHERE client_token = ANY(%s::uuid[])
+              AND client_token NOT IN (SELECT client_token FROM ins)
+            """,
+            (*(list(c) for c in cols), list(cols[7])),
+        )
+        ids = dict(cur.fetchall())
+        missing = [r.token for r in rows if r.token not in ids]
+        if missing:
+            # тот же token параллельно записала другая транзакция — её строку видно только сейчас
             cur.execute(
-                """
-                SELECT is_correct
-                FROM options
-                WHERE id=%s AND question_id=%s
-                """,
-                (int(chosen), qid),
+                "SELECT client_token::text, id FROM results WHERE client_token = ANY(%s::uuid[])",
+                (missing,),
             )
-            row = cur.fetchone()
-            if row and row[0] is True:
-                score += 1
+            ids.update(cur.fetchall())
 
-    return score, total
+    if commit:
+        db.commit()
+        invalidate_pages("leaderboard")
+    return [int(ids[r.token]) for r in rows]
 
 
-# =========================
-# Results / leaderboard
-# =========================
+class _PendingResult:
+    __slots__ = ("row", "done", "lead", "result_id", "error")
+
+    def __init__(self, row: ResultRow):
+        self.row = row
+        self.done = threading.Event()
+        self.lead = False
+        self.result_id: Optional[int] = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultGroupCommit:
+    """
+    Групповая запись попыток внутри процесса: параллельные save_result встают
+    в очередь, первый из них (ведущий) через window секунд забирает до max_batch
+    попыток и пишет их одним insert_results — один INSERT и один COMMIT на своём
+    соединении. Остальные ждут свой id. Пока ведущий пишет, новые попытки копятся;
+    следующим ведущим становится первая из них.
+
+    Выигрыш есть при нескольких потоках на воркер (gunicorn --threads); при
+    одном потоке пачка всегда из одной попытки.
+
+    Если пачка не записалась из-за данных одной из попыток (например, викторину
+    удалили), ведущий пишет попытки по одной: ошибку получает только сбойная.
+    Ошибка соединения с базой достаётся всей пачке.
+    """
+
+    def __init__(self, window: float = 0.0, max_batch: int = 200):
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._queue: List[_PendingResult] = []
+        self._leader_active = False
+        self.batches = 0
+        self.rows = 0
+        self.largest = 0
+
+    def submit(self, row: ResultRow) -> int:
+        pending = _PendingResult(row)
+        with self._lock:
+            self._queue.append(pending)
+            lead = not self._leader_active
+            self._leader_active = True
+
+        if not lead:
+            pending.done.wait()
+            lead = pending.lead
+        if lead:
+            self._lead()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result_id
+
+    def _lead(self) -> None:
+        if self.window:
+            time.sleep(self.window)
+        with self._lock:
+            batch = self._queue[: self.max_batch]
+            del self._queue[: len(batch)]
+
+        try:
+            ids = insert_results([p.row for p in batch])
+            for p, rid in zip(batch, ids):
+                p.result_id = rid
+        except Exception as e:
+            get_db().rollback()
+            if len(batch) == 1 or isinstance(e, psycopg.OperationalError):
+                for p in batch:
+                    p.error = e
+            else:
+                self._insert_one_by_one(batch)
+        except BaseException as e:
+            for p in batch:
+                p.error = e
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.rows += len(batch)
+                self.largest = max(self.largest, len(batch))
+                if self._queue:
+                    nxt = self._queue[0]
+                    nxt.lead = True
+                    nxt.done.set()
+                else:
+                    self._leader_active = False
+            for p in batch:
+                p.done.set()
+
+    @staticmethod
+    def _insert_one_by_one(batch: List[_PendingResult]) -> None:
+        for i, p in enumerate(batch):
+            try:
+                p.result_id = insert_results([p.row])[0]
+            except psycopg.OperationalError as e:
+                for rest in batch[i:]:
+                    rest.error = e
+                return
+            except Exception as e:
+                get_db().rollback()
+                p.error = e
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "rows": self.rows,
+                "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0,
+                "largest_batch": self.largest,
+                "queued": len(self._queue),
+            }
+
+
+def _result_group_commit() -> ResultGroupCommit:
+    global _group_commit
+    if _group_commit is None:
+        _group_commit = ResultGroupCommit(
+            window=current_app.config.get("RESULT_GROUP_COMMIT_WINDOW", 0.0),
+            max_batch=current_app.config.get("RESULT_GROUP_COMMIT_MAX_BATCH", 200),
+        )
+    return _group_commit
+
+
+def result_group_commit_stats() -> Dict[str, Any]:
+    return _result_group_commit().stats()
+
 
 def save_result(
     user_id: int,
@@ -140,23 +593,17 @@ def save_result(
     total: int,
     duration_seconds: int | None,
     points: int,
+    token: Optional[str] = None,
 ) -> int:
     """
-    Сохраняет попытку и возвращает result_id
+    Сохраняет попытку и возвращает result_id.
+    token — id попытки (attempts): повторная отправка вернёт тот же result_id.
+    При RESULT_GROUP_COMMIT — вместе с параллельными попытками одной пачкой.
     """
-    db = get_db()
-    with db.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO results (user_id, quiz_id, score, total, duration_seconds, points)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id
-            """,
-            (user_id, quiz_id, score, total, duration_seconds, points),
-        )
-        rid = cur.fetchone()[0]
-    db.commit()
-    return int(rid)
+    row = ResultRow(user_id, quiz_id, score, total, duration_seconds, points, token=token)
+    if current_app.config.get("RESULT_GROUP_COMMIT"):
+        return _result_group_commit().submit(row)
+    return insert_results([row])[0]
 
 
 def get_result(result_id: int) -> Optional[Dict[str, Any]]:
@@ -191,48 +638,194 @@ def get_result(result_id: int) -> Optional[Dict[str, Any]]:
     }
 
 
+# Ключ сортировки попыток внутри викторины — совпадает с idx_results_quiz_rank
+_RANK_COLUMNS = (
+    "(-COALESCE({t}.points, -2147483647))",
+    "COALESCE({t}.duration_seconds, 2147483647)",
+    "{t}.created_at",
+    "{t}.id",
+)
+
+
+def _rank_key(t: str) -> str:
+    """Ключ как кортеж — для сравнения "строго лучше/хуже"."""
+    return "(" + ", ".join(c.format(t=t) for c in _RANK_COLUMNS) + ")"
+
+
+def _rank_order(t: str, desc: bool = False) -> str:
+    """Ключ как список для ORDER BY (по столбцам — чтобы работал индекс)."""
+    suffix = " DESC" if desc else ""
+    return ", ".join(c.format(t=t) + suffix for c in _RANK_COLUMNS)
+
+
 def get_result_rank_in_quiz(result_id: int) -> int:
     """
     Место попытки среди всех попыток ЭТОЙ викторины по points DESC,
     затем duration ASC (быстрее — лучше).
+    Считается на сервере как COUNT(*) строго лучших попыток по индексу
+    idx_results_quiz_rank, без выгрузки id всех результатов.
     """
     db = get_db()
     with db.cursor() as cur:
-        cur.execute("SELECT quiz_id FROM results WHERE id=%s", (result_id,))
-        r = cur.fetchone()
-        if not r:
-            return 0
-        quiz_id = r[0]
+        cur.execute(
+            f"""
+            SELECT (
+              SELECT COUNT(*)
+              FROM results r
+              WHERE r.quiz_id = t.quiz_id
+                AND {_rank_key("r")} < {_rank_key("t")}
+            ) + 1
+            FROM results t
+            WHERE t.id=%s
+            """,
+            (result_id,),
+        )
+        row = cur.fetchone()
+
+    return int(row[0]) if row else 0
+
+
+_QUIZ_LB_COLUMNS = """
+    r.id, r.user_id, u.username, r.points, r.score, r.total, r.duration_seconds, r.created_at
+"""
+
+
+def _quiz_lb_row(r, rank: int) -> Dict[str, Any]:
+    return {
+        "result_id": r[0],
+        "user_id": r[1],
+        "username": r[2],
+        "points": r[3],
+        "score": r[4],
+        "total": r[5],
+        "duration_seconds": r[6],
+        "created_at": r[7],
+        "rank": rank,
+    }
+
+
+def get_quiz_leaderboard(
+    quiz_id: int,
+    after_result_id: int | None = None,
+    limit: int = 20,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Рейтинг попыток викторины в порядке get_result_rank_in_quiz.
+    Keyset-пагинация: курсор — id последней попытки предыдущей страницы,
+    следующая страница ищется по индексу idx_results_quiz_rank без OFFSET.
+    Возвращает (строки, курсор следующей страницы или None)
+    """
+    db = get_db()
+    with db.cursor() as cur:
+        if after_result_id:
+            cur.execute(
+                f"""
+                SELECT {_QUIZ_LB_COLUMNS}
+                FROM results r
+                JOIN users u ON u.id = r.user_id
+                JOIN results t ON t.id = %s AND t.quiz_id = r.quiz_id
+                WHERE r.quiz_id=%s
+                  AND {_rank_key("r")} > {_rank_key("t")}
+                ORDER BY {_rank_order("r")}
+                LIMIT %s
+                """,
+                (after_result_id, quiz_id, limit + 1),
+            )
+        else:
+            cur.execute(
+                f"""
+                SELECT {_QUIZ_LB_COLUMNS}
+                FROM results r
+                JOIN users u ON u.id = r.user_id
+                WHERE r.quiz_id=%s
+                ORDER BY {_rank_order("r")}
+                LIMIT %s
+                """,
+                (quiz_id, limit + 1),
+            )
+        rows = cur.fetchall()
+
+    first_rank = get_result_rank_in_quiz(after_result_id) + 1 if after_result_id and rows else 1
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [_quiz_lb_row(r, first_rank + i) for i, r in enumerate(rows)]
+    next_cursor = items[-1]["result_id"] if has_more else None
+    return items, next_cursor
+
 
+def get_quiz_leaderboard_around(result_id: int, radius: int = 5) -> List[Dict[str, Any]]:
+    """
+    "Моё окружение": до radius попыток выше и ниже указанной, в порядке рейтинга.
+    """
+    rank = get_result_rank_in_quiz(result_id)
+    if not rank:
+        return []
+
+    db = get_db()
+    with db.cursor() as cur:
         cur.execute(
-            """
-            SELECT id
-            FROM results
-            WHERE quiz_id=%s
-            ORDER BY points DESC NULLS LAST,
-                     duration_seconds ASC NULLS LAST,
-                     created_at ASC
+            f"""
+            (
+              SELECT {_QUIZ_LB_COLUMNS}, -1 AS side
+              FROM results r
+              JOIN users u ON u.id = r.user_id
+              JOIN results t ON t.id = %s AND t.quiz_id = r.quiz_id
+              WHERE {_rank_key("r")} < {_rank_key("t")}
+              ORDER BY {_rank_order("r", desc=True)}
+              LIMIT %s
+            )
+            UNION ALL
+            (
+              SELECT {_QUIZ_LB_COLUMNS}, 1 AS side
+              FROM results r
+              JOIN users u ON u.id = r.user_id
+              JOIN results t ON t.id = %s AND t.quiz_id = r.quiz_id
+              WHERE {_rank_key("r")} >= {_rank_key("t")}
+              ORDER BY {_rank_order("r")}
+              LIMIT %s
+            )
             """,
-            (quiz_id,),
+            (result_id, radius, result_id, radius + 1),
         )
-        ids = [x[0] for x in cur.fetchall()]
+        rows = cur.fetchall()
 
-    return ids.index(result_id) + 1 if result_id in ids else 0
+    above = [r for r in rows if r[-1] < 0][::-1]
+    below = [r for r in rows if r[-1] > 0]
+    start = rank - len(above)
+    return [_quiz_lb_row(r, start + i) for i, r in enumerate(above + below)]
+
+
+def get_user_best_result_id(quiz_id: int, user_id: int) -> Optional[int]:
+    """Лучшая попытка игрока в викторине (по тому же порядку, что и рейтинг)."""
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT r.id
+            FROM results r
+            WHERE r.quiz_id=%s AND r.user_id=%s
+            ORDER BY {_rank_order("r")}
+            LIMIT 1
+            """,
+            (quiz_id, user_id),
+        )
+        row = cur.fetchone()
+    return int(row[0]) if row else None
 
 
 def get_leaderboard(limit=50):
+    """
+    Общий рейтинг: top-N по индексу idx_user_stats_score
+    (очки = сумма правильных ответов по всем попыткам).
+    """
     db = get_db()
     with db.cursor() as cur:
         cur.execute(
             """
-            SELECT
-              u.id AS user_id,
-              u.username,
-              COALESCE(SUM(r.score), 0) AS points
-            FROM results r
-            JOIN users u ON u.id = r.user_id
-            GROUP BY u.id, u.username
-            ORDER BY points DESC
+            SELECT s.user_id, u.username, s.total_score AS points
+            FROM user_stats s
+            JOIN users u ON u.id = s.user_id
+            ORDER BY s.total_score DESC, s.user_id ASC
             LIMIT %s
             """,
             (limit,),
@@ -243,12 +836,200 @@ def get_leaderboard(limit=50):
     return [{"user_id": r[0], "username": r[1], "points": r[2]} for r in rows]
 
 
+_USER_STATS_FROM_RESULTS = """
+    SELECT user_id, SUM(score), COALESCE(SUM(points), 0), COUNT(*), COALESCE(MAX(points), 0)
+    FROM results
+"""
+
+
+def _refresh_user_stats(cur, user_ids: List[int]) -> None:
+    """
+    Пересчитывает агрегаты указанных игроков из results.
+
+    Сначала блокирует их строки user_stats (в порядке user_id — без взаимных
+    блокировок): параллельный insert_results ждёт, пока пересчёт не закоммитится,
+    и добавляет своё приращение уже к новым значениям. Без блокировки пересчёт
+    брал бы снимок results до чужого коммита и затирал бы это приращение.
+    """
+    if not user_ids:
+        return
+    cur.execute(
+        "SELECT user_id FROM user_stats WHERE user_id = ANY(%s) ORDER BY user_id FOR UPDATE",
+        (user_ids,),
+    )
+    # следующий запрос — новый снимок (READ COMMITTED): видны все попытки,
+    # закоммиченные до того, как мы получили блокировки
+    cur.execute(
+        f"""
+        INSERT INTO user_stats (user_id, total_score, total_points, attempts, best_points)
+        {_USER_STATS_FROM_RESULTS}
+        WHERE user_id = ANY(%s)
+        GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+          total_score = EXCLUDED.total_score,
+          total_points = EXCLUDED.total_points,
+          attempts = EXCLUDED.attempts,
+          best_points = EXCLUDED.best_points,
+          updated_at = now()
+        """,
+        (user_ids,),
+    )
+    cur.execute(
+        """
+        DELETE FROM user_stats s
+        WHERE s.user_id = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM results r WHERE r.user_id = s.user_id)
+        """,
+        (user_ids,),
+    )
+
+
+def rebuild_leaderboard() -> int:
+    """
+    Полностью пересобирает user_stats из results. Возвращает число игроков.
+    TRUNCATE блокирует таблицу, поэтому параллельные save_result дождутся
+    окончания пересборки и применят свои приращения уже к новым данным.
+    """
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute("TRUNCATE user_stats")
+        cur.execute(
+            f"""
+            INSERT INTO user_stats (user_id, total_score, total_points, attempts, best_points)
+            {_USER_STATS_FROM_RESULTS}
+            GROUP BY user_id
+            """
+        )
+        count = cur.rowcount
+    db.commit()
+    invalidate_pages("leaderboard")
+    return int(count)
+
+
+def check_leaderboard() -> List[Dict[str, Any]]:
+    """
+    Сверяет user_stats с агрегатами по results.
+    Возвращает расхождения (пустой список — всё согласовано).
+    """
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            f"""
+            WITH expected (user_id, total_score, total_points, attempts, best_points) AS (
+              {_USER_STATS_FROM_RESULTS}
+              GROUP BY user_id
+            )
+            SELECT COALESCE(e.user_id, s.user_id),
+                   e.total_score, s.total_score,
+                   e.total_points, s.total_points,
+                   e.attempts, s.attempts,
+                   e.best_points, s.best_points
+            FROM expected e
+            FULL OUTER JOIN user_stats s ON s.user_id = e.user_id
+            WHERE (e.total_score, e.total_points, e.attempts, e.best_points)
+                  IS DISTINCT FROM (s.total_score, s.total_points, s.attempts, s.best_points)
+            ORDER BY 1
+            """
+        )
+        rows = cur.fetchall()
+    db.rollback()
+
+    return [
+        {
+            "user_id": r[0],
+            "expected": {"total_score": r[1], "total_points": r[3], "attempts": r[5], "best_points": r[7]},
+            "actual": {"total_score": r[2], "total_points": r[4], "attempts": r[6], "best_points": r[8]},
+        }
+        for r in rows
+    ]
 
 
 # =========================
 # Admin: create / list / delete
 # =========================
 
+def _insert_quizzes(cur, created_by: int | None, quizzes: List[Dict[str, Any]]) -> List[int]:
+    """
+    Вставляет викторины с вопросами и вариантами за постоянное число запросов
+    (4 штуки независимо от размера): id заранее берутся из последовательностей,
+    строки передаются массивами и разворачиваются через unnest.
+
+    quizzes = [{"title": ..., "subtitle": ..., "image_path": ..., "questions": questions_payload}, ...]
+    Возвращает id викторин в том же порядке.
+    """
+    n_quizzes = len(quizzes)
+    n_questions = sum(len(qz["questions"]) for qz in quizzes)
+
+    cur.execute(
+        """
+        SELECT
+          ARRAY(SELECT nextval(pg_get_serial_sequence('quizzes', 'id')) FROM generate_series(1, %s)),
+          ARRAY(SELECT nextval(pg_get_serial_sequence('questions', 'id')) FROM generate_series(1, %s)),
+          ARRAY(SELECT nextval(pg_get_serial_sequence('options', 'id')) FROM generate_series(1, %s))
+        """,
+        (n_quizzes, n_questions, n_questions * 4),
+    )
+    quiz_ids, question_ids, option_ids = cur.fetchone()
+
+    qz_cols: Dict[str, list] = {"title": [], "subtitle": [], "image_path": []}
+    q_cols: Dict[str, list] = {"id": [], "quiz_id": [], "text": [], "position": [], "image_path": [], "explanation": []}
+    o_cols: Dict[str, list] = {"id": [], "question_id": [], "text": [], "is_correct": []}
+
+    question_ids_iter = iter(question_ids)
+    option_ids_iter = iter(option_ids)
+    for quiz_id, qz in zip(quiz_ids, quizzes):
+        qz_cols["title"].append(qz["title"])
+        qz_cols["subtitle"].append(qz.get("subtitle"))
+        qz_cols["image_path"].append(qz.get("image_path"))
+
+        for idx, q in enumerate(qz["questions"], start=1):
+            qid = next(question_ids_iter)
+            q_cols["id"].append(qid)
+            q_cols["quiz_id"].append(quiz_id)
+            q_cols["text"].append(q["text"])
+            q_cols["position"].append(idx)
+            q_cols["image_path"].append(q.get("image_path"))
+            q_cols["explanation"].append(q.get("explanation"))
+
+            correct = int(q["correct"])
+            opts = q["options"]
+            if len(opts) != 4:
+                raise ValueError("Each question must have exactly 4 options")
+
+            for i, opt_text in enumerate(opts, start=1):
+                o_cols["id"].append(next(option_ids_iter))
+                o_cols["question_id"].append(qid)
+                o_cols["text"].append(opt_text)
+                o_cols["is_correct"].append(i == correct)
+
+    cur.execute(
+        """
+        INSERT INTO quizzes (id, title, subtitle, image_path, created_by)
+        SELECT u.id, u.title, u.subtitle, u.image_path, %s
+        FROM unnest(%s::int[], %s::text[], %s::text[], %s::text[]) AS u(id, title, subtitle, image_path)
+        """,
+        (created_by, list(quiz_ids), qz_cols["title"], qz_cols["subtitle"], qz_cols["image_path"]),
+    )
+    if q_cols["id"]:
+        cur.execute(
+            """
+            INSERT INTO questions (id, quiz_id, text, position, image_path, explanation)
+            SELECT * FROM unnest(%s::int[], %s::int[], %s::text[], %s::int[], %s::text[], %s::text[])
+            """,
+            (q_cols["id"], q_cols["quiz_id"], q_cols["text"], q_cols["position"],
+             q_cols["image_path"], q_cols["explanation"]),
+        )
+        cur.execute(
+            """
+            INSERT INTO options (id, question_id, text, is_correct)
+            SELECT * FROM unnest(%s::int[], %s::int[], %s::text[], %s::bool[])
+            """,
+            (o_cols["id"], o_cols["question_id"], o_cols["text"], o_cols["is_correct"]),
+        )
+
+    return [int(x) for x in quiz_ids]
+
+
 def create_quiz(
     created_by: int,
     title: str,
@@ -270,67 +1051,66 @@ def create_quiz(
     db = get_db()
 
     with db.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO quizzes (title, subtitle, image_path, created_by)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id
-            """,
-            (title, subtitle, image_path, created_by),
+        (quiz_id,) = _insert_quizzes(
+            cur,
+            created_by,
+            [{"title": title, "subtitle": subtitle, "image_path": image_path, "questions": questions_payload}],
         )
-        quiz_id = cur.fetchone()[0]
-
-        for idx, q in enumerate(questions_payload, start=1):
-            cur.execute(
-                """
-                INSERT INTO questions (quiz_id, text, position, image_path, explanation)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id
-                """,
-                (quiz_id, q["text"], idx, q.get("image_path"), q.get("explanation")),
-            )
-            qid = cur.fetchone()[0]
-
-            correct = int(q["correct"])
-            opts = q["options"]
-            if len(opts) != 4:
-                raise ValueError("Each question must have exactly 4 options")
-
-            for i, opt_text in enumerate(opts, start=1):
-                cur.execute(
-                    """
-                    INSERT INTO options (question_id, text, is_correct)
-                    VALUES (%s, %s, %s)
-                    """,
-                    (qid, opt_text, (i == correct)),
-                )
 
     db.commit()
-    return int(quiz_id)
+    invalidate_answer_key(quiz_id)
+    invalidate_pages("catalog")
+    return quiz_id
 
 
-def admin_list_quizzes() -> List[Dict[str, Any]]:
+def create_quizzes_bulk(created_by: int | None, quizzes: List[Dict[str, Any]], commit: bool = True) -> List[int]:
+    """
+    Создаёт пачку викторин за постоянное число запросов.
+    quizzes: [{"title", "subtitle", "image_path", "questions": questions_payload}, ...]
+    commit=False — вставка остаётся в текущей транзакции (импорт большими потоками).
+    """
+    if not quizzes:
+        return []
+
     db = get_db()
     with db.cursor() as cur:
-        cur.execute(
-            """
-            SELECT id, title, subtitle, created_at
-            FROM quizzes
-            ORDER BY created_at DESC
-            """
-        )
-        rows = cur.fetchall()
+        quiz_ids = _insert_quizzes(cur, created_by, quizzes)
 
-    return [{"id": r[0], "title": r[1], "subtitle": r[2], "created_at": r[3]} for r in rows]
+    if commit:
+        db.commit()
+    for quiz_id in quiz_ids:
+        invalidate_answer_key(quiz_id)
+    invalidate_pages("catalog")
+    return quiz_ids
+
+
+def admin_list_quizzes(cursor: str | None = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Викторины для админки постранично.
+    Возвращает (викторины, курсор следующей страницы или None)
+    """
+    rows, next_cursor = _catalog_page("id, title, subtitle, created_at", cursor, limit)
+    return [{"id": r[0], "title": r[1], "subtitle": r[2], "created_at": r[3]} for r in rows], next_cursor
 
 
 def delete_quiz(quiz_id: int) -> None:
     """
     Удаляем викторину полностью:
-    options -> questions -> results -> quizzes
+    options -> questions -> results (+ пересчёт user_stats затронутых игроков) -> quizzes
+    и осиротевшие файлы картинок — всё в одной транзакции
     """
     db = get_db()
     with db.cursor() as cur:
+        cur.execute(
+            """
+            SELECT image_path FROM quizzes WHERE id=%s
+            UNION
+            SELECT image_path FROM questions WHERE quiz_id=%s
+            """,
+            (quiz_id, quiz_id),
+        )
+        image_paths = [r[0] for r in cur.fetchall()]
+
         cur.execute(
             """
             DELETE FROM options
@@ -339,9 +1119,14 @@ def delete_quiz(quiz_id: int) -> None:
             (quiz_id,),
         )
         cur.execute("DELETE FROM questions WHERE quiz_id=%s", (quiz_id,))
-        cur.execute("DELETE FROM results WHERE quiz_id=%s", (quiz_id,))
+        cur.execute("DELETE FROM results WHERE quiz_id=%s RETURNING user_id", (quiz_id,))
+        affected = sorted({r[0] for r in cur.fetchall()})
+        _refresh_user_stats(cur, affected)
         cur.execute("DELETE FROM quizzes WHERE id=%s", (quiz_id,))
+    release_uploads(image_paths)  # под блокировками файлов, до коммита
     db.commit()
+    invalidate_answer_key(quiz_id)
+    invalidate_pages("catalog", f"quiz:{quiz_id}", "leaderboard")
 
 def admin_get_quiz(quiz_id: int) -> Optional[Dict[str, Any]]:
     db = get_db()
@@ -361,10 +1146,20 @@ def admin_update_quiz(quiz_id: int, title: str, subtitle: str, image_path: str |
     with db.cursor() as cur:
         cur.execute(
             """
-            UPDATE quizzes
-            SET title=%s, subtitle=%s, image_path=%s
-            WHERE id=%s
+            UPDATE quizzes q
+            SET title=%s, subtitle=%s, image_path=%s, version = q.version + 1,
+                image_variants = CASE WHEN old.image_path IS DISTINCT FROM %s THEN NULL
+                                      ELSE q.image_variants END
+            FROM (SELECT id, image_path FROM quizzes WHERE id=%s FOR UPDATE) old
+            WHERE q.id = old.id
+            RETURNING old.image_path
             """,
-            (title, subtitle, image_path, quiz_id)
+            (title, subtitle, image_path, image_path, quiz_id)
         )
-    db.commit()
\ No newline at end of file
+        row = cur.fetchone()
+    # прежняя картинка могла остаться без ссылок; проверка — в этой же транзакции
+    if row and row[0] and row[0] != image_path:
+        release_uploads([row[0]])
+    db.commit()
+    invalidate_answer_key(quiz_id)
+    invalidate_pages("catalog", f"quiz:{quiz_id}")
\ No newline at end of file
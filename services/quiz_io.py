@@ -0,0 +1,238 @@
+# services/quiz_io.py
+"""
+Массовый импорт и экспорт викторин: разбор и проверка записей (JSON / NDJSON / CSV),
+пакетная вставка через quiz.create_quizzes_bulk и потоковая выгрузка в NDJSON.
+
+Формат одной викторины:
+    {"title": "...", "subtitle": "...", "image_path": "uploads/quizzes/x.png",
+     "questions": [{"text": "...", "options": ["a","b","c","d"], "correct": 1..4,
+                    "explanation": "...", "image_path": "uploads/questions/y.png"}, ...]}
+
+CSV — строка на вопрос, подряд идущие строки одной викторины объединяются:
+    quiz_title,quiz_subtitle,quiz_image,question,option1,option2,option3,option4,correct,explanation,question_image
+"""
+from __future__ import annotations
+
+import csv
+import json
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.db import get_db
+from services.quiz import create_quizzes_bulk
+from services.response_cache import invalidate_pages
+
+CSV_COLUMNS = [
+    "quiz_title", "quiz_subtitle", "quiz_image",
+    "question", "option1", "option2", "option3", "option4", "correct",
+    "explanation", "question_image",
+]
+
+log = logging.getLogger(__name__)
+
+
+class QuizImportError(ValueError):
+    def __init__(self, message: str, line: Optional[int] = None):
+        super().__init__(message)
+        self.line = line
+
+
+def _image_ref(value: Any) -> Optional[str]:
+    """Ссылка на уже загруженный файл в static/ (относительный путь, без выхода наверх)."""
+    if not value:
+        return None
+    path = str(value).strip()
+    if path.startswith("/") or ".." in path.split("/"):
+        raise ValueError("bad image path")
+    return path
+
+
+def normalize_quiz(obj: Any) -> Dict[str, Any]:
+    """Проверяет запись викторины (те же правила, что и форма создания)."""
+    if not isinstance(obj, dict):
+        raise ValueError("quiz must be an object")
+    title = str(obj.get("title") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+
+    questions = obj.get("questions")
+    if not isinstance(questions, list) or not questions:
+        raise ValueError("questions must be a non-empty list")
+
+    normalized = []
+    for q in questions:
+        if not isinstance(q, dict) or "text" not in q or "options" not in q or "correct" not in q:
+            raise ValueError("bad question format")
+        if not isinstance(q["options"], list) or len(q["options"]) != 4:
+            raise ValueError("options must be 4")
+        c = int(q["correct"])
+        if c < 1 or c > 4:
+            raise ValueError("correct must be 1..4")
+        normalized.append(
+            {
+                "text": str(q["text"]),
+                "options": [str(o) for o in q["options"]],
+                "correct": c,
+                "explanation": q.get("explanation") or None,
+                "image_path": _image_ref(q.get("image_path")),
+            }
+        )
+
+    return {
+        "title": title,
+        "subtitle": str(obj.get("subtitle") or "").strip(),
+        "image_path": _image_ref(obj.get("image_path")),
+        "questions": normalized,
+    }
+
+
+def _lines(stream: Iterable[bytes]) -> Iterator[str]:
+    for raw in stream:
+        yield raw.decode("utf-8-sig") if isinstance(raw, bytes) else raw
+
+
+def iter_ndjson(stream: Iterable[bytes]) -> Iterator[Tuple[int, Any]]:
+    """(номер строки, объект) по одной викторине на строку; пустые строки пропускаются."""
+    for lineno, line in enumerate(_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield lineno, json.loads(line)
+        except json.JSONDecodeError as e:
+            raise QuizImportError(f"bad JSON: {e.msg}", lineno) from None
+
+
+def iter_csv(stream: Iterable[bytes]) -> Iterator[Tuple[int, Any]]:
+    """(номер строки начала викторины, объект); подряд идущие строки одной викторины — её вопросы."""
+    reader = csv.DictReader(_lines(stream))
+    missing = [c for c in CSV_COLUMNS if c not in (reader.fieldnames or [])]
+    if missing:
+        raise QuizImportError(f"missing CSV columns: {', '.join(missing)}", 1)
+
+    current: Optional[Dict[str, Any]] = None
+    start_line = 0
+    for row in reader:
+        key = (row["quiz_title"], row["quiz_subtitle"], row["quiz_image"])
+        if current is None or current["_key"] != key:
+            if current is not None:
+                current.pop("_key")
+                yield start_line, current
+            current = {
+                "_key": key,
+                "title": row["quiz_title"],
+                "subtitle": row["quiz_subtitle"],
+                "image_path": row["quiz_image"],
+                "questions": [],
+            }
+            start_line = reader.line_num
+        current["questions"].append(
+            {
+                "text": row["question"],
+                "options": [row["option1"], row["option2"], row["option3"], row["option4"]],
+                "correct": row["correct"],
+                "explanation": row["explanation"],
+                "image_path": row["question_image"],
+            }
+        )
+
+    if current is not None:
+        current.pop("_key")
+        yield start_line, current
+
+
+def iter_json_array(data: Any) -> Iterator[Tuple[int, Any]]:
+    if not isinstance(data, list):
+        raise QuizImportError("expected a JSON array of quizzes")
+    for i, obj in enumerate(data, start=1):
+        yield i, obj
+
+
+def import_quizzes(
+    records: Iterable[Tuple[int, Any]],
+    created_by: int | None,
+    batch_size: int = 200,
+) -> List[int]:
+    """
+    Проверяет записи и вставляет их пачками по batch_size викторин.
+    Всё в одной транзакции: при первой ошибке импорт откатывается целиком.
+    Возвращает id созданных викторин.
+    """
+    db = get_db()
+    created: List[int] = []
+    batch: List[Dict[str, Any]] = []
+    try:
+        for line, obj in records:
+            try:
+                batch.append(normalize_quiz(obj))
+            except (ValueError, TypeError) as e:
+                raise QuizImportError(str(e), line) from None
+            if len(batch) >= batch_size:
+                created += create_quizzes_bulk(created_by, batch, commit=False)
+                batch = []
+        if batch:
+            created += create_quizzes_bulk(created_by, batch, commit=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    invalidate_pages("catalog")
+    return created
+
+
+def export_quizzes(itersize: int = 2000) -> Iterator[Dict[str, Any]]:
+    """
+    Выгружает викторины по одной (в формате импорта), читая строки
+    серверным курсором пачками по itersize — вся база в память не загружается.
+    Вопросы без правильного варианта (is_correct нигде не выставлен) пропускаются,
+    как и оставшиеся без вопросов викторины: импорт их не примет.
+    """
+    db = get_db()
+    with db.cursor(name="quiz_export") as cur:
+        cur.itersize = itersize
+        cur.execute(
+            """
+            SELECT qz.id, qz.title, qz.subtitle, qz.image_path,
+                   q.id, q.text, q.image_path, q.explanation,
+                   o.text, o.is_correct
+            FROM quizzes qz
+            JOIN questions q ON q.quiz_id = qz.id
+            JOIN options o ON o.question_id = q.id
+            ORDER BY qz.id, q.position, q.id, o.id
+            """
+        )
+
+        quiz: Optional[Dict[str, Any]] = None
+        question: Optional[Dict[str, Any]] = None
+        quiz_id = question_id = None
+        for qz_id, title, subtitle, qz_img, q_id, q_text, q_img, q_exp, o_text, o_correct in cur:
+            if qz_id != quiz_id:
+                if quiz is not None and _drop_unanswered(quiz_id, quiz):
+                    yield quiz
+                quiz_id = qz_id
+                quiz = {"title": title, "subtitle": subtitle, "image_path": qz_img, "questions": []}
+            if q_id != question_id:
+                question_id = q_id
+                question = {"text": q_text, "options": [], "correct": None, "explanation": q_exp, "image_path": q_img}
+                quiz["questions"].append(question)
+            question["options"].append(o_text)
+            if o_correct:
+                question["correct"] = len(question["options"])
+
+        if quiz is not None and _drop_unanswered(quiz_id, quiz):
+            yield quiz
+    db.rollback()
+
+
+def _drop_unanswered(quiz_id: int, quiz: Dict[str, Any]) -> bool:
+    """Убирает из выгрузки вопросы без правильного ответа; False — если вопросов не осталось."""
+    questions = [q for q in quiz["questions"] if q["correct"] is not None]
+    skipped = len(quiz["questions"]) - len(questions)
+    if skipped:
+        log.warning("export: quiz %s: skipped %d question(s) without a correct option", quiz_id, skipped)
+        quiz["questions"] = questions
+    return bool(questions)
+
+
+def export_ndjson(itersize: int = 2000) -> Iterator[str]:
+    for quiz in export_quizzes(itersize):
+        yield json.dumps(quiz, ensure_ascii=False) + "\n"
@@ -0,0 +1,145 @@
+# services/response_cache.py
+"""
+Кэш готовых страниц для GET-вьюх, которые редко меняются.
+
+Ключ: путь + query-параметры + вариант пользователя (гость / роль)
++ текущие версии тегов страницы. Инвалидация — invalidate_pages(tag, ...):
+версия тега растёт, и старые записи просто перестают находиться (дожидаются
+вытеснения или TTL). Поэтому бэкенду не нужно уметь перечислять ключи.
+
+Бэкенд подключаемый: RESPONSE_CACHE_BACKEND — "memory" или путь к классу
+("package.module:Class") с интерфейсом MemoryBackend.
+
+Ограничение "memory": и записи, и версии тегов живут в памяти процесса, поэтому
+invalidate_pages сбрасывает кэш только того воркера, где прошла правка. Остальные
+воркеры gunicorn отдают старую страницу, пока не истечёт RESPONSE_CACHE_TTL, —
+это и есть верхняя граница устаревания. Если она неприемлема, нужен бэкенд с
+общими для воркеров версиями тегов (get_version / bump_version во внешнем
+хранилище); сами записи при этом могут оставаться локальными.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from flask import Response, current_app, make_response, request, session
+from werkzeug.utils import import_string
+
+from services.cache import LRUCache
+
+
+class MemoryBackend:
+    """
+    Кэш в памяти процесса: LRU с TTL; версии тегов не вытесняются.
+    Инвалидация видна только этому процессу — другие воркеры ждут TTL.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = None):
+        self._entries = LRUCache(maxsize, name="pages", ttl=ttl)
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    def set(self, key: str, entry: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        self._entries.set(key, entry, ttl)
+
+    def get_version(self, tag: str) -> int:
+        return self._versions.get(tag, 0)
+
+    def bump_version(self, tag: str) -> None:
+        with self._lock:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return self._entries.stats()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_not_modified = 0
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                cfg = current_app.config
+                name = cfg["RESPONSE_CACHE_BACKEND"]
+                cls = MemoryBackend if name == "memory" else import_string(name)
+                _backend = cls(maxsize=cfg["RESPONSE_CACHE_SIZE"], ttl=cfg["RESPONSE_CACHE_TTL"])
+    return _backend
+
+
+def invalidate_pages(*tags: str) -> None:
+    """Сбрасывает закэшированные страницы с данными тегами (например "catalog", "quiz:5")."""
+    backend = get_backend()
+    for tag in tags:
+        backend.bump_version(tag)
+
+
+def response_cache_stats() -> Dict[str, Any]:
+    stats = dict(get_backend().stats())
+    stats["not_modified"] = _not_modified
+    return stats
+
+
+def _cache_key(tags) -> str:
+    backend = get_backend()
+    user_variant = f"{bool(session.get('user_id'))}:{session.get('role') or ''}"
+    versions = ",".join(f"{t}={backend.get_version(t)}" for t in tags)
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return f"{request.path}?{args}|{user_variant}|{versions}"
+
+
+def cached_page(*tags: str, ttl: Optional[float] = None):
+    """
+    Кэширует ответ вьюхи (только 200 на GET) и отдаёт его с ETag / Last-Modified;
+    условные запросы получают 304 без рендера. Теги могут ссылаться на аргументы
+    маршрута: @cached_page("quiz:{quiz_id}").
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            global _not_modified
+            if not current_app.config["RESPONSE_CACHE_ENABLED"] or request.method != "GET":
+                return view(*args, **kwargs)
+
+            key = _cache_key([t.format(**kwargs) for t in tags])
+            backend = get_backend()
+            entry = backend.get(key)
+            if entry is None:
+                rv = make_response(view(*args, **kwargs))
+                if rv.status_code != 200 or rv.direct_passthrough:
+                    return rv
+                body = rv.get_data()
+                entry = {
+                    "body": body,
+                    "mimetype": rv.mimetype,
+                    "etag": hashlib.sha1(body).hexdigest(),
+                    "last_modified": datetime.now(timezone.utc).replace(microsecond=0),
+                }
+                backend.set(key, entry, ttl)
+
+            resp = Response(entry["body"], mimetype=entry["mimetype"])
+            resp.set_etag(entry["etag"])
+            resp.last_modified = entry["last_modified"]
+            # страница зависит от сессии — только браузерный кэш и всегда с ревалидацией
+            resp.cache_control.private = True
+            resp.cache_control.no_cache = True
+            resp.vary.add("Cookie")
+            resp = resp.make_conditional(request)
+            if resp.status_code == 304:
+                with _backend_lock:
+                    _not_modified += 1
+            return resp
+
+        return wrapped
+
+    return decorator
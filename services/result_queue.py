@@ -0,0 +1,330 @@
+# services/result_queue.py
+"""
+Отложенная запись результатов (write-behind, RESULT_WRITE_BEHIND=1).
+
+Проверенная попытка сначала ложится в локальную очередь — SQLite-файл
+RESULT_QUEUE_PATH (WAL, synchronous=FULL, общий для воркеров одной машины), —
+и ответ не ждёт коммита в Postgres. Фоновый поток каждого воркера раз в
+RESULT_QUEUE_FLUSH_INTERVAL забирает пачку записей и переносит её в results
+через quiz.insert_results. У записи есть token (results.client_token), поэтому
+повторный перенос после падения между коммитом Postgres и отметкой в очереди
+дублей не создаёт.
+
+Пока запись не перенесена, страница результата строится из очереди
+(get_pending_result); перенесённые записи хранятся ещё RESULT_QUEUE_RETENTION
+секунд, чтобы страница ожидания могла перенаправить на /result/<id>.
+
+Если пачка не записалась из-за данных (например, викторину удалили, пока
+попытка ждала в очереди), записи пачки переносятся по одной: остальные проходят,
+у сбойной растёт attempts и сохраняется last_error. После
+RESULT_QUEUE_MAX_ATTEMPTS неудач запись помечается dead_at и больше не берётся —
+одна «ядовитая» запись не блокирует очередь. Ошибки соединения с Postgres
+попыткой записи не считаются: пачка возвращается в очередь целиком.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import psycopg
+from flask import Flask, current_app
+
+from services.db import get_db
+from services.quiz import ResultRow, insert_results
+
+log = logging.getLogger(__name__)
+
+# Запись, взятая потоком, который не отметил её за это время (воркер упал), берётся снова
+CLAIM_TIMEOUT = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_results (
+  token TEXT PRIMARY KEY,
+  user_id INTEGER NOT NULL,
+  quiz_id INTEGER NOT NULL,
+  score INTEGER NOT NULL,
+  total INTEGER NOT NULL,
+  duration_seconds INTEGER,
+  points INTEGER NOT NULL,
+  created_at TEXT NOT NULL,
+  claimed_at REAL,
+  result_id INTEGER,
+  flushed_at REAL,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  last_error TEXT,
+  dead_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_pending_results_queue
+  ON pending_results (created_at) WHERE result_id IS NULL;
+CREATE INDEX IF NOT EXISTS idx_pending_results_flushed
+  ON pending_results (flushed_at) WHERE result_id IS NOT NULL;
+"""
+
+_COLUMNS = "token, user_id, quiz_id, score, total, duration_seconds, points, created_at"
+
+# Колонки, добавленные после первой версии очереди: у старых файлов — через ALTER TABLE
+_ADDED_COLUMNS = {
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "last_error": "TEXT",
+    "dead_at": "REAL",
+}
+
+_local = threading.local()
+_flusher: Optional[threading.Thread] = None
+_flusher_pid: Optional[int] = None
+_flusher_lock = threading.Lock()
+_stop = threading.Event()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """Соединение с очередью — своё у каждого потока (и процесса)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key == (os.getpid(), path):
+        return conn
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(_SCHEMA)
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(pending_results)")}
+    for name, decl in _ADDED_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE pending_results ADD COLUMN {name} {decl}")
+    _local.conn, _local.key = conn, (os.getpid(), path)
+    return conn
+
+
+def _queue() -> sqlite3.Connection:
+    return _connect(current_app.config["RESULT_QUEUE_PATH"])
+
+
+def enqueue_result(row: ResultRow) -> str:
+    """Кладёт попытку в очередь и возвращает её token. Коммит SQLite — до возврата."""
+    token = row.token or str(uuid.uuid4())
+    created_at = row.created_at or datetime.now(timezone.utc)
+    _queue().execute(
+        # повторная отправка той же попытки (тот же token) — уже в очереди
+        f"INSERT OR IGNORE INTO pending_results ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (token, row.user_id, row.quiz_id, row.score, row.total,
+         row.duration_seconds, row.points, created_at.isoformat()),
+    )
+    start_flusher(current_app._get_current_object())
+    return token
+
+
+def get_pending_result(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Запись очереди в виде, похожем на quiz.get_result; "id" — result_id,
+    если запись уже перенесена в results, иначе None; "dead" — перенести
+    запись не удалось и пытаться больше не будем.
+    """
+    row = _queue().execute(
+        "SELECT user_id, quiz_id, score, total, duration_seconds, points, result_id, dead_at"
+        " FROM pending_results WHERE token = ?",
+        (token,),
+    ).fetchone()
+    if not row:
+        return None
+
+    return {
+        "id": row[6],
+        "token": token,
+        "user_id": row[0],
+        "quiz_id": row[1],
+        "score": row[2],
+        "total": row[3],
+        "duration_seconds": row[4],
+        "points": row[5],
+        "dead": row[7] is not None,
+    }
+
+
+def _claim(conn: sqlite3.Connection, limit: int) -> List[ResultRow]:
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            f"""
+            SELECT {_COLUMNS} FROM pending_results
+            WHERE result_id IS NULL AND dead_at IS NULL
+              AND (claimed_at IS NULL OR claimed_at < ?)
+            ORDER BY created_at
+            LIMIT ?
+            """,
+            (now - CLAIM_TIMEOUT, limit),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE pending_results SET claimed_at = ? WHERE token = ?",
+            [(now, r[0]) for r in rows],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    return [
+        ResultRow(
+            user_id=r[1], quiz_id=r[2], score=r[3], total=r[4], duration_seconds=r[5],
+            points=r[6], created_at=datetime.fromisoformat(r[7]), token=r[0],
+        )
+        for r in rows
+    ]
+
+
+def _release(conn: sqlite3.Connection, rows: List[ResultRow]) -> None:
+    conn.executemany(
+        "UPDATE pending_results SET claimed_at = NULL WHERE token = ?",
+        [(r.token,) for r in rows],
+    )
+
+
+def _mark_flushed(conn: sqlite3.Connection, pairs: List[tuple]) -> None:
+    now = time.time()
+    conn.executemany(
+        "UPDATE pending_results SET result_id = ?, flushed_at = ? WHERE token = ?",
+        [(rid, now, r.token) for r, rid in pairs],
+    )
+
+
+def _mark_failed(conn: sqlite3.Connection, row: ResultRow, error: Exception) -> None:
+    """
+    Неудачная попытка записи. claimed_at остаётся — запись возьмут снова только
+    через CLAIM_TIMEOUT, а не в этом же flush; после MAX_ATTEMPTS — dead_at.
+    """
+    max_attempts = current_app.config["RESULT_QUEUE_MAX_ATTEMPTS"]
+    attempts = conn.execute(
+        """
+        UPDATE pending_results
+        SET attempts = attempts + 1, last_error = ?,
+            dead_at = CASE WHEN attempts + 1 >= ? THEN ? END
+        WHERE token = ?
+        RETURNING attempts
+        """,
+        (f"{type(error).__name__}: {error}"[:1000], max_attempts, time.time(), row.token),
+    ).fetchone()[0]
+    if attempts >= max_attempts:
+        log.error("result queue: giving up on %s after %d attempts: %s", row.token, attempts, error)
+    else:
+        log.warning("result queue: %s failed (attempt %d): %s", row.token, attempts, error)
+
+
+def _insert_one_by_one(conn: sqlite3.Connection, rows: List[ResultRow]) -> int:
+    """
+    Пачка не записалась: каждая запись — отдельной транзакцией, чтобы сбойная
+    не держала остальные. Возвращает число перенесённых.
+    """
+    db = get_db()
+    flushed = 0
+    for i, row in enumerate(rows):
+        try:
+            rid = insert_results([row])[0]
+        except psycopg.OperationalError:
+            # база недоступна — данные тут ни при чём, остаток пачки ждёт следующего раза
+            _release(conn, rows[i:])
+            raise
+        except Exception as e:
+            db.rollback()
+            _mark_failed(conn, row, e)
+            continue
+        _mark_flushed(conn, [(row, rid)])
+        flushed += 1
+    return flushed
+
+
+def flush(limit: Optional[int] = None) -> int:
+    """
+    Переносит очередь в results пачками по RESULT_QUEUE_BATCH_SIZE, пока есть
+    свободные записи (или пока не перенесено limit). Возвращает число перенесённых.
+    """
+    conn = _queue()
+    batch_size = current_app.config["RESULT_QUEUE_BATCH_SIZE"]
+    flushed = 0
+
+    while limit is None or flushed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - flushed)
+        rows = _claim(conn, size)
+        if not rows:
+            break
+        try:
+            ids = insert_results(rows)
+        except psycopg.OperationalError:
+            _release(conn, rows)
+            raise
+        except Exception as e:
+            get_db().rollback()
+            if len(rows) == 1:
+                _mark_failed(conn, rows[0], e)
+            else:
+                log.warning("result queue: batch of %d failed, retrying one by one: %s", len(rows), e)
+                flushed += _insert_one_by_one(conn, rows)
+            continue
+        _mark_flushed(conn, list(zip(rows, ids)))
+        flushed += len(rows)
+
+    conn.execute(
+        "DELETE FROM pending_results WHERE result_id IS NOT NULL AND flushed_at < ?",
+        (time.time() - current_app.config["RESULT_QUEUE_RETENTION"],),
+    )
+    return flushed
+
+
+def queue_stats() -> Dict[str, Any]:
+    pending, oldest, done, dead = _queue().execute(
+        """
+        SELECT COUNT(*) FILTER (WHERE result_id IS NULL AND dead_at IS NULL),
+               MIN(created_at) FILTER (WHERE result_id IS NULL AND dead_at IS NULL),
+               COUNT(*) FILTER (WHERE result_id IS NOT NULL),
+               COUNT(*) FILTER (WHERE dead_at IS NOT NULL)
+        FROM pending_results
+        """
+    ).fetchone()
+    age = None
+    if oldest:
+        age = (datetime.now(timezone.utc) - datetime.fromisoformat(oldest)).total_seconds()
+    return {"pending": pending, "oldest_age_seconds": age, "flushed_retained": done, "dead": dead}
+
+
+def _flush_loop(app: Flask) -> None:
+    interval = app.config["RESULT_QUEUE_FLUSH_INTERVAL"]
+    while not _stop.wait(interval):
+        with app.app_context():
+            try:
+                flush()
+            except Exception:
+                # записи остаются в очереди; следующая попытка — через interval
+                log.exception("result queue flush failed")
+                _stop.wait(min(interval * 10, 30))
+
+
+def start_flusher(app: Flask) -> None:
+    """Фоновый поток переноса — один на процесс (после fork воркера — новый)."""
+    global _flusher, _flusher_pid
+    pid = os.getpid()
+    if _flusher is not None and _flusher_pid == pid and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is not None and _flusher_pid == pid and _flusher.is_alive():
+            return
+        _flusher = threading.Thread(
+            target=_flush_loop, args=(app,), name="result-queue-flusher", daemon=True
+        )
+        _flusher_pid = pid
+        _flusher.start()
+
+
+def init_result_queue(app: Flask) -> None:
+    if not app.config["RESULT_WRITE_BEHIND"]:
+        return
+
+    @app.before_request
+    def _ensure_flusher():
+        # перезапущенный воркер дописывает то, что осталось в очереди от прошлого
+        start_flusher(app)
@@ -0,0 +1,293 @@
+# services/uploads.py
+"""
+Загрузки картинок с адресацией по содержимому: файл называется
+<sha256>.<ext>, одинаковые картинки хранятся на диске один раз.
+
+Счётчик ссылок на файл — число строк quizzes/questions с этим image_path
+(upload_refcount); release_uploads удаляет файлы, на которые больше никто не ссылается.
+Файлы, которые release_uploads пропустил как свежие (или загруженные под так и
+не сохранённую викторину), подбирает sweep_uploads — `flask uploads-gc`.
+
+Проверка ссылок и удаление файла идут под pg_advisory_xact_lock(hashtext(image_path))
+в той же транзакции, что и правка строк; save_upload берёт ту же блокировку в
+транзакции запроса, и она держится до коммита строки, которая сошлётся на файл.
+Поэтому одинаковая картинка, загруженная во время удаления, не теряется: либо
+удаление видит новую ссылку, либо загрузка видит, что файла уже нет, и пишет его заново.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+
+from services.db import get_db
+from services.images import VARIANTS_DIR, variant_files
+
+CHUNK_SIZE = 64 * 1024
+
+# Свежие файлы не удаляются: их могли только что загрузить под ещё не сохранённую викторину
+GC_GRACE_SECONDS = 15 * 60
+
+# Каталоги загрузок старых версий (относительно static/), в которых тоже могут быть файлы
+LEGACY_UPLOAD_DIRS = ("uploads/questions",)
+
+
+def _upload_folder() -> Path:
+    return Path(current_app.config["UPLOAD_FOLDER"])
+
+
+def _static_path(image_path: str) -> Path:
+    return Path(current_app.static_folder) / image_path
+
+
+def _image_path(file_path: Path) -> str:
+    """Абсолютный путь файла -> image_path (относительно static/)."""
+    try:
+        return file_path.relative_to(Path(current_app.static_folder)).as_posix()
+    except ValueError:
+        return f"uploads/quizzes/{file_path.name}"
+
+
+def _extension(filename: Optional[str]) -> str:
+    return os.path.splitext(filename or "")[1].lstrip(".").lower()
+
+
+def allowed_image(filename: Optional[str]) -> bool:
+    """Расширение файла из ALLOWED_IMAGE_EXTENSIONS (имя без точки — нет)."""
+    return _extension(filename) in current_app.config["ALLOWED_IMAGE_EXTENSIONS"]
+
+
+def _content_name(digest: str, ext: str) -> str:
+    return f"{digest}.{ext.lower()}"
+
+
+def _lock_upload(image_path: str) -> None:
+    """Блокировка файла загрузки до конца текущей транзакции."""
+    with get_db().cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (image_path,))
+
+
+def save_upload(file: FileStorage) -> str:
+    """
+    Сохраняет загрузку под именем по sha256 содержимого.
+    Хэш считается по ходу записи во временный файл — без копии файла в памяти.
+    Возвращает image_path для БД; ValueError — недопустимое расширение файла.
+    Открывает транзакцию запроса с блокировкой файла: ссылку на него нужно
+    записать в той же транзакции (create_quiz / admin_update_quiz её коммитят).
+    """
+    if not allowed_image(file.filename):
+        raise ValueError(f"unsupported image file name: {file.filename!r}")
+    ext = _extension(file.filename)
+    folder = _upload_folder()
+    folder.mkdir(parents=True, exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                out.write(chunk)
+
+        target = folder / _content_name(digest.hexdigest(), ext)
+        _lock_upload(_image_path(target))
+        if target.exists():
+            os.unlink(tmp)
+            os.utime(target)  # продлеваем "свежесть" для GC
+        else:
+            os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    return _image_path(target)
+
+
+def upload_refcount(image_path: str) -> int:
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            SELECT (SELECT COUNT(*) FROM quizzes WHERE image_path=%s)
+                 + (SELECT COUNT(*) FROM questions WHERE image_path=%s)
+            """,
+            (image_path, image_path),
+        )
+        count = cur.fetchone()[0]
+    return int(count)
+
+
+def release_uploads(image_paths: Iterable[Optional[str]]) -> List[str]:
+    """
+    Удаляет файлы загрузок, на которые не осталось ссылок. Вызывать в той же
+    транзакции, что удаляет/заменяет ссылки, до её коммита: блокировки файлов
+    держатся до коммита. Возвращает удалённые image_path.
+    """
+    folder = _upload_folder().resolve()
+    removed: List[str] = []
+    # в порядке путей — две транзакции не ждут блокировок друг друга по кругу
+    for image_path in sorted({p for p in image_paths if p}):
+        path = _static_path(image_path).resolve()
+        if folder not in path.parents:
+            continue
+        _lock_upload(image_path)
+        if not path.is_file():
+            continue
+        if time.time() - path.stat().st_mtime < GC_GRACE_SECONDS:
+            continue
+        if upload_refcount(image_path):
+            continue
+        try:
+            for variant in variant_files(image_path):
+                variant.unlink()
+            path.unlink()
+            removed.append(image_path)
+        except OSError:
+            pass
+    return removed
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dedupe_uploads(dry_run: bool = False) -> Dict[str, int]:
+    """
+    Приводит каталог загрузок к адресации по содержимому: переименовывает файлы
+    в <sha256>.<ext>, дубликаты удаляет, ссылки в quizzes/questions переписывает
+    (с повышением version затронутых викторин — ключ кэша содержимого).
+    """
+    folder = _upload_folder()
+    stats = {"files": 0, "renamed": 0, "duplicates": 0, "bytes_freed": 0, "references": 0}
+    db = get_db()
+
+    for path in sorted(p for p in folder.iterdir() if p.is_file() and "." in p.name):
+        if path.suffix == ".part":
+            continue
+        stats["files"] += 1
+        ext = path.name.rsplit(".", 1)[1]
+        target = folder / _content_name(_file_sha256(path), ext)
+        if target == path:
+            continue
+
+        old_ref, new_ref = _image_path(path), _image_path(target)
+        duplicate = target.exists()
+        if duplicate:
+            stats["duplicates"] += 1
+            stats["bytes_freed"] += path.stat().st_size
+        else:
+            stats["renamed"] += 1
+        if dry_run:
+            continue
+
+        # производные названы по старому имени — сбрасываем, `flask images-derive` пересоберёт
+        with db.cursor() as cur:
+            cur.execute(
+                "UPDATE quizzes SET image_path=%s, image_variants=NULL, version = version + 1 WHERE image_path=%s",
+                (new_ref, old_ref),
+            )
+            stats["references"] += cur.rowcount
+            cur.execute(
+                "UPDATE questions SET image_path=%s, image_variants=NULL WHERE image_path=%s RETURNING quiz_id",
+                (new_ref, old_ref),
+            )
+            quiz_ids = sorted({r[0] for r in cur.fetchall()})
+            stats["references"] += cur.rowcount
+            if quiz_ids:
+                cur.execute("UPDATE quizzes SET version = version + 1 WHERE id = ANY(%s)", (quiz_ids,))
+        db.commit()
+
+        # файл трогаем только после коммита ссылок
+        for variant in variant_files(old_ref):
+            variant.unlink()
+        if duplicate:
+            path.unlink()
+        else:
+            os.replace(path, target)
+
+    return stats
+
+
+def _referenced_paths() -> set:
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            SELECT image_path FROM quizzes WHERE image_path IS NOT NULL
+            UNION
+            SELECT image_path FROM questions WHERE image_path IS NOT NULL
+            """
+        )
+        paths = {r[0] for r in cur.fetchall()}
+    db.rollback()
+    return paths
+
+
+def sweep_uploads(dry_run: bool = False) -> Dict[str, int]:
+    """
+    Удаляет файлы загрузок старше GC_GRACE_SECONDS, на которые нет ссылок,
+    в UPLOAD_FOLDER и каталогах LEGACY_UPLOAD_DIRS, вместе с их производными;
+    а также производные, чей исходник уже не используется, и брошенные .part.
+    """
+    static = Path(current_app.static_folder)
+    folders = [_upload_folder()] + [static / d for d in LEGACY_UPLOAD_DIRS]
+    referenced = _referenced_paths()
+    cutoff = time.time() - GC_GRACE_SECONDS
+    stats = {"files": 0, "removed": 0, "variants": 0, "bytes_freed": 0}
+    seen = set()
+
+    def remove(path: Path, key: str) -> None:
+        if path in seen:
+            return
+        seen.add(path)
+        stats[key] += 1
+        stats["bytes_freed"] += path.stat().st_size
+        if not dry_run:
+            path.unlink()
+
+    for folder in folders:
+        if not folder.is_dir():
+            continue
+        for path in sorted(p for p in folder.iterdir() if p.is_file()):
+            stats["files"] += 1
+            if path.stat().st_mtime > cutoff:
+                continue
+            if path.suffix == ".part":
+                remove(path, "removed")  # недописанная загрузка упавшего воркера
+                continue
+            image_path = _image_path(path)
+            if image_path in referenced:
+                continue
+            if not dry_run:
+                # ссылка могла появиться после снимка referenced — перепроверяем под блокировкой
+                _lock_upload(image_path)
+                if not path.is_file() or upload_refcount(image_path):
+                    get_db().rollback()
+                    continue
+            for variant in variant_files(image_path):
+                remove(variant, "variants")
+            remove(path, "removed")
+            if not dry_run:
+                get_db().commit()
+
+    # производные, у исходника которых не осталось ссылок (исходник удалён раньше)
+    live_stems = {Path(p).stem for p in referenced}
+    variants = _upload_folder() / VARIANTS_DIR
+    if variants.is_dir():
+        for path in sorted(p for p in variants.iterdir() if p.is_file()):
+            if path.stat().st_mtime > cutoff or path.stem.rsplit("_", 1)[0] in live_stems:
+                continue
+            remove(path, "variants")
+
+    return stats
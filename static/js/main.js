@@ -32,12 +32,10 @@ document.addEventListener('keydown', (e) => {
 
   const timerEl = document.getElementById('timerValue');
   const formEl = document.getElementById('quizForm');
-  const durationInput = document.getElementById('duration_seconds');
 
   if (!counterEl || !qBarEl || !timerEl || !formEl) return;
 
   let timeLeft = TOTAL_TIME;
-  const startedAt = Date.now();
 
   function formatTime(s) {
     const m = Math.floor(s / 60);
@@ -59,17 +57,12 @@ document.addEventListener('keydown', (e) => {
     }
   }
 
-  function finishAndSubmit() {
-    const elapsed = Math.round((Date.now() - startedAt) / 1000);
-    if (durationInput) durationInput.value = elapsed;
-    formEl.submit();
-  }
-
   function tick() {
     updateTimeUI();
 
     if (timeLeft <= 0) {
-      finishAndSubmit();
+      // время вышло — отправляем форму, длительность попытки считает сервер
+      formEl.submit();
       return;
     }
 
@@ -115,32 +108,6 @@ document.addEventListener('keydown', (e) => {
     });
   });
 
-  // при ручной отправке тоже запишем duration_seconds
-  formEl.addEventListener('submit', () => {
-    const elapsed = Math.round((Date.now() - startedAt) / 1000);
-    if (durationInput) durationInput.value = elapsed;
-  });
-
   show(0);
   tick();
 })();
-const formEl = document.getElementById('quizForm');
-const durationInput = document.getElementById('duration_seconds');
-const startedAt = Date.now();
-
-function setDuration(){
-  if (!durationInput) return;
-  const elapsed = Math.round((Date.now() - startedAt) / 1000);
-  durationInput.value = elapsed;
-}
-
-// если авто-отправка (время вышло)
-function finishAndSubmit(){
-  setDuration();
-  formEl.submit();
-}
-
-// если обычная отправка кнопкой
-formEl.addEventListener('submit', () => {
-  setDuration();
-});
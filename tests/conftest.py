@@ -0,0 +1,79 @@
+# tests/conftest.py
+"""
+Тесты, которым нужна база, берут DATABASE_URL из окружения (схема — `flask db-upgrade`)
+и пропускаются, если Postgres недоступен или схема устарела.
+"""
+from __future__ import annotations
+
+import uuid
+
+import pytest
+
+from app import create_app
+from config import Config
+from services.db import close_pool, get_db
+from services.migrations import check_schema
+from services.quiz import create_quiz, delete_quiz
+
+TEST_EMAIL_DOMAIN = "tests.local"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # детектор N+1 и бюджеты SQL маршрутов — во всех тестах, превышение роняет тест
+    monkeypatch.setattr(Config, "QUERY_DEBUG", True)
+    monkeypatch.setattr(Config, "QUERY_BUDGET_STRICT", True)
+    app = create_app()
+    app.config.update(
+        TESTING=True,
+        RESULT_QUEUE_PATH=str(tmp_path / "result_queue.sqlite3"),
+        RESPONSE_CACHE_ENABLED=False,
+        DB_POOL_TIMEOUT=3,
+    )
+    yield app
+    close_pool()
+
+
+@pytest.fixture
+def db_app(app):
+    with app.app_context():
+        try:
+            check_schema()
+        except Exception as e:
+            pytest.skip(f"database is not available: {e}")
+        get_db().rollback()
+    return app
+
+
+@pytest.fixture
+def user_id(db_app):
+    with db_app.app_context():
+        db = get_db()
+        with db.cursor() as cur:
+            cur.execute(
+                "INSERT INTO users (email, username, password_hash) VALUES (%s, %s, '-') RETURNING id",
+                (f"{uuid.uuid4().hex}@{TEST_EMAIL_DOMAIN}", f"test_{uuid.uuid4().hex[:12]}"),
+            )
+            uid = cur.fetchone()[0]
+        db.commit()
+    yield uid
+    with db_app.app_context():
+        db = get_db()
+        with db.cursor() as cur:
+            cur.execute("DELETE FROM user_stats WHERE user_id = %s", (uid,))
+            cur.execute("DELETE FROM results WHERE user_id = %s", (uid,))
+            cur.execute("DELETE FROM users WHERE id = %s", (uid,))
+        db.commit()
+
+
+@pytest.fixture
+def quiz_id(db_app, user_id):
+    questions = [
+        {"text": f"Вопрос {i}", "options": ["А", "Б", "В", "Г"], "correct": 1, "explanation": ""}
+        for i in range(1, 4)
+    ]
+    with db_app.app_context():
+        qid = create_quiz(user_id, f"[test] {uuid.uuid4().hex[:8]}", "", None, questions)
+    yield qid
+    with db_app.app_context():
+        delete_quiz(qid)
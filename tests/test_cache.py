@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from services.cache import LRUCache, SharedFileCache
+from services.quiz import OptionContent, QuestionContent, QuizContent, _quiz_content_from_json
+
+
+def _content() -> QuizContent:
+    options = (OptionContent(1, "А"), OptionContent(2, "Б"))
+    questions = (
+        QuestionContent(10, "Вопрос", 1, None, "Пояснение", options),
+        QuestionContent(11, "С картинкой", 2, "uploads/q.png", None, options, {"webp": {"320": "v/q_320.webp"}}),
+    )
+    return QuizContent(5, 3, "Викторина", None, "uploads/c.png", questions, {"png": {"640": "uploads/c.png"}})
+
+
+def test_file_cache_round_trips_quiz_content(tmp_path):
+    cache = SharedFileCache(8, name="quiz_content", directory=str(tmp_path / "c"), decode=_quiz_content_from_json)
+    cache.set((5, 3), _content())
+
+    # другой воркер с тем же каталогом
+    other = SharedFileCache(8, name="quiz_content", directory=str(tmp_path / "c"), decode=_quiz_content_from_json)
+    assert other.get((5, 3)) == _content()
+    assert other.get((5, 4)) is None
+    assert not any(name.endswith(".pickle") for name in os.listdir(tmp_path / "c"))
+
+
+def test_file_cache_requires_directory():
+    with pytest.raises(ValueError):
+        SharedFileCache(8, name="quiz_content")
+
+
+def test_file_cache_rejects_writable_directory(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        SharedFileCache(8, directory=str(shared))
+
+
+def test_file_cache_ignores_entry_writable_by_others(tmp_path):
+    cache = SharedFileCache(8, directory=str(tmp_path / "c"))
+    cache.set("k", [1, 2])
+    os.chmod(cache._path("k"), 0o666)
+    assert cache.get("k") is None
+
+
+def test_file_cache_hits_under_group_writable_umask(tmp_path):
+    old = os.umask(0o002)
+    try:
+        cache = SharedFileCache(8, directory=str(tmp_path / "c"))
+        cache.set("k", {"a": 1})
+        assert cache.get("k") == {"a": 1}
+    finally:
+        os.umask(old)
+    assert cache.stats()["hits"] == 1
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path / "c"))
+
+
+def test_lru_invalidate_does_not_accumulate_generations():
+    cache = LRUCache(4)
+    for key in range(1000):
+        cache.invalidate(key)  # как create_quiz для новых id
+    cache.get_or_load("a", lambda: 1)
+    cache.clear()
+    assert cache._loading == {}
+
+
+def test_lru_drops_value_invalidated_during_load():
+    cache = LRUCache(4)
+
+    def loader():
+        cache.invalidate("k")  # правка пришла, пока грузили
+        return "stale"
+
+    assert cache.get_or_load("k", loader) == "stale"
+    assert cache.get("k") is None
+    assert cache.get_or_load("k", lambda: "fresh") == "fresh"
+    assert cache.get("k") == "fresh"
+    assert cache._loading == {}
+
+
+def test_lru_failed_load_is_forgotten():
+    cache = LRUCache(4)
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("k", lambda: (_ for _ in ()).throw(RuntimeError("db down")))
+    assert cache._loading == {}
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import pytest
+from psycopg.errors import ForeignKeyViolation
+
+from services.quiz import ResultGroupCommit, ResultRow, _PendingResult
+
+
+def test_bad_row_fails_only_its_own_waiter(db_app, user_id, quiz_id):
+    gc = ResultGroupCommit()
+    rows = [
+        ResultRow(user_id, quiz_id, 1, 3, 20, 100),
+        ResultRow(user_id, -1, 1, 3, 20, 100),  # такой викторины нет
+        ResultRow(user_id, quiz_id, 3, 3, 20, 300),
+    ]
+    pending = [_PendingResult(r) for r in rows]
+    with db_app.app_context():
+        # три попытки встали в очередь к одному ведущему
+        gc._queue.extend(pending)
+        gc._leader_active = True
+        gc._lead()
+
+    good = [pending[0], pending[2]]
+    assert all(p.done.is_set() for p in pending)
+    assert all(p.error is None and p.result_id for p in good)
+    assert isinstance(pending[1].error, ForeignKeyViolation)
+    assert pending[1].result_id is None
+    assert gc.stats()["queued"] == 0
+
+
+def test_single_bad_row_raises(db_app, user_id):
+    with db_app.app_context(), pytest.raises(ForeignKeyViolation):
+        ResultGroupCommit().submit(ResultRow(user_id, -1, 1, 3, 20, 100))
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import re
+
+import pytest
+from flask import render_template_string
+
+from services.images import build_variants
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def image_app(app, tmp_path):
+    static = tmp_path / "static"
+    app.static_folder = str(static)
+    app.config["UPLOAD_FOLDER"] = str(static / "uploads" / "quizzes")
+    app.config["IMAGE_VARIANT_WIDTHS"] = (320, 640, 1280)
+    (static / "uploads" / "quizzes").mkdir(parents=True)
+    Image.new("RGB", (1000, 500), "teal").save(static / "uploads" / "quizzes" / "cover.png")
+    return app
+
+
+def test_variants_include_original_width(image_app):
+    with image_app.app_context():
+        variants = build_variants("uploads/quizzes/cover.png")
+
+    assert sorted(variants["png"], key=int) == ["320", "640", "1000"]
+    assert variants["png"]["1000"] == "uploads/quizzes/cover.png"  # исходник, не копия
+    assert sorted(variants["webp"], key=int) == ["320", "640", "1000"]
+    with Image.open(f"{image_app.static_folder}/{variants['webp']['1000']}") as webp:
+        assert webp.size == (1000, 500)
+
+
+def test_picture_srcset_lists_original(image_app):
+    with image_app.test_request_context():
+        variants = build_variants("uploads/quizzes/cover.png")
+        html = render_template_string(
+            '{% from "_images.html" import picture %}{{ picture(path, variants, sizes="720px") }}',
+            path="uploads/quizzes/cover.png", variants=variants,
+        )
+    assert re.search(r"uploads/quizzes/cover\.png(\?v=\w+)? 1000w", html)
+    assert re.search(r"variants/cover_1000\.webp(\?v=\w+)? 1000w", html)
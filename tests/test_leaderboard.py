@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from services.db import get_db
+from services.quiz import ResultRow, create_quiz, delete_quiz, insert_results
+
+
+def _stats(user_id):
+    with get_db().cursor() as cur:
+        cur.execute(
+            "SELECT total_score, total_points, attempts, best_points FROM user_stats WHERE user_id = %s",
+            (user_id,),
+        )
+        stored = cur.fetchone()
+        cur.execute(
+            "SELECT SUM(score), SUM(points), COUNT(*), MAX(points) FROM results WHERE user_id = %s",
+            (user_id,),
+        )
+        expected = cur.fetchone()
+    get_db().rollback()
+    return stored, expected
+
+
+def test_delete_quiz_keeps_concurrent_insert(db_app, user_id, quiz_id):
+    questions = [{"text": "В", "options": ["А", "Б", "В", "Г"], "correct": 1, "explanation": ""}]
+    with db_app.app_context():
+        doomed = create_quiz(user_id, "[test] doomed", "", None, questions)
+        insert_results([ResultRow(user_id, doomed, 1, 1, 10, 100)])
+
+    inserted, release = threading.Event(), threading.Event()
+    errors = []
+
+    def insert_and_hold():
+        # попытка по другой викторине: строка user_stats заблокирована до коммита
+        try:
+            with db_app.app_context():
+                insert_results([ResultRow(user_id, quiz_id, 3, 3, 10, 300)], commit=False)
+                inserted.set()
+                release.wait(10)
+                get_db().commit()
+        except Exception as e:  # pragma: no cover - видно в assert ниже
+            errors.append(e)
+            inserted.set()
+
+    def delete():
+        try:
+            with db_app.app_context():
+                delete_quiz(doomed)
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    writer = threading.Thread(target=insert_and_hold)
+    writer.start()
+    assert inserted.wait(10)
+    deleter = threading.Thread(target=delete)
+    deleter.start()
+    time.sleep(0.3)  # удаление дошло до пересчёта user_stats и ждёт блокировку
+    release.set()
+    writer.join(10)
+    deleter.join(10)
+
+    assert not errors
+    with db_app.app_context():
+        stored, expected = _stats(user_id)
+    assert stored == expected == (3, 300, 1, 300)
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_database(app):
+    app.config["SCHEMA_CHECK"] = False  # /metrics не ходит в базу
+
+
+def test_metrics_disabled_by_default(app):
+    assert app.test_client().get("/metrics").status_code == 404
+
+
+def test_metrics_without_token_only_in_debug(app):
+    app.config["METRICS_ENABLED"] = True
+    assert app.test_client().get("/metrics").status_code == 200  # TESTING
+
+    app.testing = False
+    assert app.test_client().get("/metrics").status_code == 403
+
+
+def test_metrics_token(app):
+    app.config.update(METRICS_ENABLED=True, METRICS_TOKEN="s3cret")
+    app.testing = False
+    client = app.test_client()
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer nope"}).status_code == 403
+
+    resp = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200
+    assert "quiz_db_query_duration_seconds" in resp.get_data(as_text=True)
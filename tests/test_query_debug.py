@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import logging
+
+import pytest
+
+from services import quiz
+from services.query_debug import (
+    QueryBudgetExceeded, fingerprint, max_queries, record_statement, repeated_statements, statement_count,
+)
+
+
+def test_fingerprint_ignores_literals_and_whitespace():
+    a = fingerprint("SELECT * FROM results  WHERE id = 1 AND name = 'x' -- comment")
+    b = fingerprint("select * from results where id = 42 and name = 'it''s'")
+    assert a == b == "select * from results where id = ? and name = ?"
+    assert fingerprint("SELECT 1 WHERE id IN (1, 2, 3)") == fingerprint("SELECT 1 WHERE id IN (4,5)")
+
+
+def test_repeated_statements_reports_n_plus_one(app):
+    with app.test_request_context():
+        record_statement("SELECT title FROM quizzes")
+        for i in range(5):
+            record_statement(f"SELECT * FROM questions WHERE quiz_id = {i}")
+
+        assert statement_count() == 6
+        [repeat] = repeated_statements(threshold=3)
+        assert repeat["fingerprint"] == "select * from questions where quiz_id = ?"
+        assert repeat["count"] == 5
+        assert sum(repeat["callers"].values()) == 5
+
+
+def test_max_queries_strict_raises(app):
+    with app.test_request_context():
+        with pytest.raises(QueryBudgetExceeded):
+            with max_queries(2):
+                for i in range(3):
+                    record_statement(f"SELECT {i}")
+        # запросы блока остаются в счёте объемлющего маршрута
+        assert statement_count() == 3
+
+
+def test_max_queries_warns_when_not_strict(app, caplog):
+    app.config["QUERY_BUDGET_STRICT"] = False
+    with app.test_request_context(), caplog.at_level(logging.WARNING, "services.query_debug"):
+        with max_queries(1, "loader"):
+            record_statement("SELECT 1")
+            record_statement("SELECT 2")
+    assert "loader: 2 queries, budget 1" in caplog.text
+
+
+@pytest.fixture
+def cold_client(db_app, user_id, monkeypatch):
+    """Только что запущенный воркер: схема не проверена, кэши процесса пусты."""
+    monkeypatch.setattr(quiz, "_answer_keys", None)
+    monkeypatch.setattr(quiz, "_quiz_contents", None)
+    db_app.config["RESULT_WRITE_BEHIND"] = False
+    db_app.config.pop("_SCHEMA_READY", None)
+    client = db_app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["role"] = "user"
+    return client
+
+
+def _budget(app, endpoint):
+    return app.view_functions[endpoint]._query_budget
+
+
+def test_quiz_pass_get_fits_budget_on_cold_worker(db_app, cold_client, quiz_id):
+    resp = cold_client.get(f"/quiz/{quiz_id}/pass")
+    assert resp.status_code == 200
+    # версия + викторина + вопросы с вариантами; проверка схемы и пула не в счёт
+    assert int(resp.headers["X-Query-Count"]) <= _budget(db_app, "quiz_pass") == 3
+
+
+def test_quiz_pass_post_fits_budget_on_cold_worker(db_app, cold_client, quiz_id):
+    with db_app.app_context():
+        questions = quiz.get_quiz_questions_with_options(quiz_id)
+    cold_client.get(f"/quiz/{quiz_id}/pass")
+    quiz._answer_keys = None  # ключ ответов — промах, как на свежем воркере
+
+    resp = cold_client.post(f"/quiz/{quiz_id}/pass", data={str(q["id"]): str(q["options"][0]["id"]) for q in questions})
+    assert resp.status_code == 302
+    # версия + ключ ответов + запись результата
+    assert int(resp.headers["X-Query-Count"]) <= _budget(db_app, "quiz_pass") == 3
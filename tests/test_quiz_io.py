@@ -0,0 +1,61 @@
+# tests/test_quiz_io.py
+from __future__ import annotations
+
+from services.db import get_db
+from services.quiz import delete_quiz
+from services.quiz_io import export_quizzes, import_quizzes
+
+
+def _clear_correct(quiz_id, position=None):
+    db = get_db()
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE options SET is_correct = FALSE
+            WHERE question_id IN (
+                SELECT id FROM questions WHERE quiz_id = %s AND (%s::int IS NULL OR position = %s)
+            )
+            """,
+            (quiz_id, position, position),
+        )
+    db.commit()
+
+
+def _title(quiz_id):
+    with get_db().cursor() as cur:
+        cur.execute("SELECT title FROM quizzes WHERE id = %s", (quiz_id,))
+        return cur.fetchone()[0]
+
+
+def _exported(title):
+    return [q for q in export_quizzes() if q["title"] == title]
+
+
+def test_export_round_trip_skips_questions_without_correct_option(db_app, user_id, quiz_id):
+    with db_app.app_context():
+        with get_db().cursor() as cur:
+            cur.execute("SELECT min(position) FROM questions WHERE quiz_id = %s", (quiz_id,))
+            first = cur.fetchone()[0]
+        _clear_correct(quiz_id, first)
+        title = _title(quiz_id)
+
+        [quiz] = _exported(title)
+        assert [q["text"] for q in quiz["questions"]] == ["Вопрос 2", "Вопрос 3"]
+
+        quiz["title"] = f"{title} (copy)"
+        created = import_quizzes([(1, quiz)], user_id)
+        try:
+            assert len(created) == 1
+            [copy] = _exported(quiz["title"])
+            assert [(q["text"], q["options"], q["correct"]) for q in copy["questions"]] == [
+                (q["text"], q["options"], q["correct"]) for q in quiz["questions"]
+            ]
+        finally:
+            for qid in created:
+                delete_quiz(qid)
+
+
+def test_export_skips_quiz_without_answerable_questions(db_app, quiz_id):
+    with db_app.app_context():
+        _clear_correct(quiz_id)
+        assert _exported(_title(quiz_id)) == []
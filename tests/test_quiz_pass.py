@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import pytest
+
+from services.db import get_db
+from services.quiz import get_quiz_questions_with_options
+
+
+@pytest.fixture
+def client(db_app, user_id):
+    db_app.config["RESULT_WRITE_BEHIND"] = False
+    client = db_app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["username"] = "test"
+        sess["role"] = "user"
+    return client
+
+
+def _answers(db_app, quiz_id):
+    with db_app.app_context():
+        return {str(q["id"]): str(q["options"][0]["id"]) for q in get_quiz_questions_with_options(quiz_id)}
+
+
+def test_submit_for_missing_quiz_is_404(client):
+    assert client.post("/quiz/999999999/pass", data={}).status_code == 404
+
+
+def test_submit_after_quiz_edit_restarts_attempt(db_app, client, quiz_id):
+    answers = _answers(db_app, quiz_id)
+    assert client.get(f"/quiz/{quiz_id}/pass").status_code == 200
+    with db_app.app_context():
+        with get_db().cursor() as cur:
+            cur.execute("UPDATE quizzes SET version = version + 1 WHERE id = %s", (quiz_id,))
+        get_db().commit()
+
+    resp = client.post(f"/quiz/{quiz_id}/pass", data=answers)
+    assert resp.status_code == 302
+    assert resp.headers["Location"].endswith(f"/quiz/{quiz_id}/pass")
+
+
+def test_replayed_cookie_returns_same_result(db_app, client, quiz_id):
+    answers = _answers(db_app, quiz_id)
+    client.get(f"/quiz/{quiz_id}/pass")
+    cookie = client.get_cookie("session").value
+
+    first = client.post(f"/quiz/{quiz_id}/pass", data=answers)
+    assert "/result/" in first.headers["Location"]
+
+    client.set_cookie("session", cookie)  # та же попытка из старой cookie
+    second = client.post(f"/quiz/{quiz_id}/pass", data=answers)
+    assert second.headers["Location"] == first.headers["Location"]
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import uuid
+
+from services import result_queue
+from services.db import get_db
+from services.quiz import ResultRow
+
+
+def _row(user_id: int, quiz_id: int) -> ResultRow:
+    return ResultRow(user_id, quiz_id, 2, 3, 30, 200, token=str(uuid.uuid4()))
+
+
+def _state(token: str):
+    return result_queue._queue().execute(
+        "SELECT result_id, attempts, last_error, dead_at FROM pending_results WHERE token = ?",
+        (token,),
+    ).fetchone()
+
+
+def test_poison_row_does_not_block_batch(db_app, user_id, quiz_id, monkeypatch):
+    db_app.config["RESULT_QUEUE_MAX_ATTEMPTS"] = 2
+    monkeypatch.setattr(result_queue, "start_flusher", lambda app: None)  # переносим сами
+    with db_app.app_context():
+        good = [_row(user_id, quiz_id) for _ in range(3)]
+        bad = _row(user_id, -1)  # такой викторины нет: FK violation на всю пачку
+        for row in (good[0], bad, good[1], good[2]):
+            result_queue.enqueue_result(row)
+
+        assert result_queue.flush() == 3
+        for row in good:
+            assert _state(row.token)[0] is not None
+        result_id, attempts, error, dead_at = _state(bad.token)
+        assert result_id is None and attempts == 1 and dead_at is None
+        assert "ForeignKeyViolation" in error
+
+        # в том же flush сбойную запись повторно не берут; после CLAIM_TIMEOUT —
+        # вторая неудача, запись dead и больше не берётся
+        assert result_queue._claim(result_queue._queue(), 10) == []
+        result_queue._queue().execute("UPDATE pending_results SET claimed_at = 0 WHERE token = ?", (bad.token,))
+        assert result_queue.flush() == 0
+        _, attempts, _, dead_at = _state(bad.token)
+        assert attempts == 2 and dead_at is not None
+        assert result_queue._claim(result_queue._queue(), 10) == []
+
+        stats = result_queue.queue_stats()
+        assert stats["pending"] == 0 and stats["dead"] == 1
+        assert result_queue.get_pending_result(bad.token)["dead"] is True
+
+        with get_db().cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM results WHERE client_token = ANY(%s::uuid[])",
+                        ([r.token for r in good],))
+            assert cur.fetchone()[0] == 3
+        get_db().rollback()
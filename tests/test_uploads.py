@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import io
+import os
+import time
+import uuid
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from services.db import get_db
+from services.uploads import GC_GRACE_SECONDS, allowed_image, save_upload, sweep_uploads
+
+
+@pytest.fixture
+def static(db_app, tmp_path):
+    static = tmp_path / "static"
+    db_app.static_folder = str(static)
+    db_app.config["UPLOAD_FOLDER"] = str(static / "uploads" / "quizzes")
+    for d in ("uploads/quizzes/variants", "uploads/questions"):
+        (static / d).mkdir(parents=True)
+    return static
+
+
+def _file(path, age: float = 0.0):
+    path.write_bytes(b"x" * 10)
+    t = time.time() - age
+    os.utime(path, (t, t))
+    return path
+
+
+def test_sweep_removes_old_unreferenced_files(db_app, static, quiz_id):
+    old = GC_GRACE_SECONDS + 60
+    kept = _file(static / "uploads/quizzes/kept-a1b2.png", old)
+    orphan = _file(static / "uploads/quizzes/orphan-a1b2.png", old)
+    orphan_variant = _file(static / "uploads/quizzes/variants/orphan-a1b2_320.webp", old)
+    fresh = _file(static / "uploads/quizzes/fresh-a1b2.png")
+    legacy = _file(static / "uploads/questions/legacy-a1b2.jpg", old)
+    stale_variant = _file(static / "uploads/quizzes/variants/gone-a1b2_640.png", old)
+    with db_app.app_context():
+        with get_db().cursor() as cur:
+            cur.execute("UPDATE quizzes SET image_path = 'uploads/quizzes/kept-a1b2.png' WHERE id = %s", (quiz_id,))
+        get_db().commit()
+
+        dry = sweep_uploads(dry_run=True)
+        assert (dry["removed"], dry["variants"]) == (2, 2)
+        assert orphan.exists() and legacy.exists()
+
+        stats = sweep_uploads()
+
+    assert (stats["removed"], stats["variants"], stats["bytes_freed"]) == (2, 2, 40)
+    assert kept.exists() and fresh.exists()
+    assert not any(p.exists() for p in (orphan, orphan_variant, legacy, stale_variant))
+
+
+@pytest.mark.parametrize("name, ok", [
+    ("cover.PNG", True), ("a.b.jpeg", True), ("png", False), (".png", False), ("x.gif", False), ("", False),
+])
+def test_allowed_image(app, name, ok):
+    with app.app_context():
+        assert allowed_image(name) is ok
+
+
+def test_save_upload_rejects_name_without_extension(app, tmp_path):
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    with app.app_context(), pytest.raises(ValueError):
+        save_upload(FileStorage(io.BytesIO(b"x"), filename="png"))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_admin_edit_with_extensionless_file_flashes(db_app, quiz_id):
+    from app import app as module_app  # admin_quiz_edit зарегистрирован на модульном app
+
+    client = module_app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = 1
+        sess["role"] = "admin"
+    resp = client.post(
+        f"/admin/quiz/{quiz_id}/edit",
+        data={"title": "t", "image": (io.BytesIO(b"x"), "png")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 302
+    assert resp.headers["Location"].endswith(f"/admin/quiz/{quiz_id}/edit")
+    with client.session_transaction() as sess:
+        assert "png/jpg/jpeg/webp" in str(sess.get("_flashes"))
+
+
+def test_release_waits_for_concurrent_upload_of_same_file(db_app, static, user_id, quiz_id, monkeypatch):
+    import threading
+
+    from services import uploads
+    from services.quiz import admin_update_quiz, create_quiz, delete_quiz
+
+    monkeypatch.setattr(uploads, "GC_GRACE_SECONDS", 0)
+    questions = [{"text": "В", "options": ["А", "Б", "В", "Г"], "correct": 1, "explanation": ""}]
+    content = f"same picture {uuid.uuid4()}".encode()
+    with db_app.app_context():
+        path = save_upload(FileStorage(io.BytesIO(content), filename="a.png"))
+        admin_update_quiz(quiz_id, "t", "", path)
+        other = create_quiz(user_id, "[test] other", "", None, questions)
+
+    uploaded, done = threading.Event(), threading.Event()
+
+    def upload_same_picture():
+        # вторая админка загружает ту же картинку; ссылку запишет чуть позже
+        with db_app.app_context():
+            assert save_upload(FileStorage(io.BytesIO(content), filename="b.png")) == path
+            uploaded.set()
+            done.wait(0.5)  # удаление успевает дойти до проверки ссылок
+            admin_update_quiz(other, "t", "", path)
+
+    t = threading.Thread(target=upload_same_picture)
+    t.start()
+    assert uploaded.wait(10)
+    with db_app.app_context():
+        delete_quiz(quiz_id)  # ждёт блокировку файла, затем видит ссылку other
+    done.set()
+    t.join(10)
+
+    assert (static / path).is_file()
+    with db_app.app_context():
+        delete_quiz(other)
+    assert not (static / path).exists()